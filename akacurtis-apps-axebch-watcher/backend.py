@@ -1,27 +1,138 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 import yaml
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
+import mmap
 import os
+import queue
+import shutil
+import socket
+import sqlite3
+import struct
+import threading
 import time
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 
 SETTINGS_PATH = "/data/settings.yml"
-STATE_PATH = "/data/state.json"
+DB_PATH = os.getenv("DB_FILE", "/data/watcher.db")
+SERIES_PATH = os.getenv("SERIES_FILE", "/data/series.bin")
+HEARTBEAT_PATH = os.getenv("HEARTBEAT_FILE", "/data/heartbeat.json")
+EVENTS_SOCKET = os.getenv("EVENTS_SOCKET", "/data/events.sock")
+CONTROL_SOCKET = os.getenv("CONTROL_SOCKET", "/data/control.sock")
+DIAGNOSTICS_DIR = os.getenv("DIAGNOSTICS_DIR", "/data/diagnostics")
+
+DEFAULT_POOL = "default"
+DEFAULT_SETTINGS = {"discord_webhook": "", "poll_seconds": 15, "umbrel_app_base": ""}
+
+
+def read_yaml(path):
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+def read_settings(path):
+    """settings.yml, falling back to the copy save_settings() keeps if it is unreadable"""
+    for candidate in (path, path + ".bak"):
+        try:
+            data = read_yaml(candidate)
+        except (OSError, yaml.YAMLError):
+            continue
+        if isinstance(data, dict):
+            return data
+    return {}
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class CachedFile:
+    """Parsed contents of a file, re-read only when its (mtime, size, inode) changes"""
+
+    def __init__(self, path, loader, default=None):
+        self.path = path
+        self.loader = loader
+        self.default = default
+        self._data = default
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self):
+        with self._lock:
+            signature = self._stat_signature()
+            if signature != self._signature:
+                data = self.default
+                if signature is not None:
+                    data = self.loader(self.path)
+                self._data = data
+                self._signature = signature
+            return self._data
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+
+SETTINGS = CachedFile(SETTINGS_PATH, read_settings, default={})
+HEARTBEAT = CachedFile(HEARTBEAT_PATH, read_json)
+
 
 def load_settings():
-    if not os.path.exists(SETTINGS_PATH):
-        return {"discord_webhook": "", "poll_seconds": 15, "umbrel_app_base": ""}
-    with open(SETTINGS_PATH, "r") as f:
-        data = yaml.safe_load(f) or {}
-        # Ensure defaults
-        data.setdefault("discord_webhook", "")
-        data.setdefault("poll_seconds", 15)
-        data.setdefault("umbrel_app_base", "")
-        return data
+    data = dict(SETTINGS.get())
+    # Ensure defaults
+    for key, value in DEFAULT_SETTINGS.items():
+        data.setdefault(key, value)
+    return data
 
 def save_settings(data):
-    with open(SETTINGS_PATH, "w") as f:
+    """Replace settings.yml atomically and durably, keeping the previous version as settings.yml.bak"""
+    tmp = SETTINGS_PATH + ".tmp"
+    with open(tmp, "w") as f:
         yaml.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(SETTINGS_PATH):
+        shutil.copy2(SETTINGS_PATH, SETTINGS_PATH + ".bak")
+    os.replace(tmp, SETTINGS_PATH)
+    fd = os.open(os.path.dirname(SETTINGS_PATH), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    SETTINGS.invalidate()
+
+def control_request(cmd, timeout=2.0, **args):
+    """One request to the watcher's control socket; None if the watcher is not listening
+    or the arguments cannot be sent as JSON (e.g. a date in a hand-edited settings.yml)"""
+    try:
+        request_line = json.dumps(dict(args, cmd=cmd)).encode("utf-8") + b"\n"
+    except (TypeError, ValueError):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(CONTROL_SOCKET)
+            sock.sendall(request_line)
+            with sock.makefile("rb") as f:
+                line = f.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError):
+        return None
 
 @app.route("/api/settings", methods=["GET"])
 def get_settings():
@@ -35,31 +146,540 @@ def update_settings():
     settings["poll_seconds"] = int(data.get("poll_seconds", 15))
     settings["umbrel_app_base"] = data.get("umbrel_app_base", "").strip()
     save_settings(settings)
+    if control_request("reload", settings=settings):
+        return jsonify({"status": "ok", "message": "Settings saved and applied."})
     return jsonify({"status": "ok", "message": "Settings saved! Watcher will use new settings on next poll."})
 
+@app.route("/api/webhook/test", methods=["POST"])
+def test_webhook():
+    """Have the watcher post a test message to the given (or configured) webhook"""
+    data = request.get_json(silent=True) or {}
+    webhook = (data.get("discord_webhook") or "").strip() or None
+    reply = control_request("test_webhook", timeout=30.0, webhook=webhook)
+    if reply is None:
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    if not reply.get("ok"):
+        return jsonify({"status": "error", "message": f"Test failed: {reply.get('error')}"}), 502
+    return jsonify({"status": "ok", "message": "Test message sent to Discord."})
+
+@app.route("/api/poll", methods=["POST"])
+def poll_now():
+    """Make the watcher poll now instead of waiting for its next interval"""
+    data = request.get_json(silent=True) or {}
+    reply = control_request("poll", pool=data.get("pool"))
+    if reply is None:
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    return jsonify({"status": "ok", "polling": reply.get("polling", [])})
+
+@app.route("/api/analytics", methods=["GET"])
+def get_analytics():
+    """Farm-wide and per-pool luck, share distribution and time-to-block, as of the last poll"""
+    reply = control_request("analytics", pool=request.args.get("pool"))
+    if reply is None or not reply.get("ok"):
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    return jsonify(reply["analytics"])
+
+@app.route("/api/watcher", methods=["GET"])
+def watcher_state():
+    """Live state straight from the watcher process"""
+    reply = control_request("state")
+    if reply is None or not reply.get("ok"):
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    return jsonify(reply["state"])
+
+@app.route("/api/diagnostics", methods=["GET"])
+def get_diagnostics():
+    """Profiles and memory reports the watcher has written, plus what it is capturing now"""
+    reply = control_request("diagnostics")
+    try:
+        names = sorted(os.listdir(DIAGNOSTICS_DIR), reverse=True)
+    except FileNotFoundError:
+        names = []
+    files = [{"name": name, "bytes": os.path.getsize(os.path.join(DIAGNOSTICS_DIR, name))}
+             for name in names if not name.endswith(".tmp")]
+    state = reply["diagnostics"] if reply and reply.get("ok") else None
+    return jsonify({"watcher": state, "files": files})
+
+@app.route("/api/diagnostics/files/<path:name>", methods=["GET"])
+def get_diagnostics_file(name):
+    return send_from_directory(DIAGNOSTICS_DIR, name, as_attachment=True, mimetype="text/plain")
+
+@app.route("/api/diagnostics/profile", methods=["POST"])
+def start_profile():
+    """Sample the watcher's stacks during its next polls ({"polls": n})"""
+    data = request.get_json(silent=True) or {}
+    reply = control_request("profile", polls=data.get("polls"))
+    if reply is None:
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    return jsonify(reply)
+
+@app.route("/api/diagnostics/memory", methods=["POST"])
+def memory_diagnostics():
+    """Start, snapshot or stop the watcher's allocation tracing ({"action": ...})"""
+    data = request.get_json(silent=True) or {}
+    reply = control_request("memory", timeout=30.0, action=data.get("action", "snapshot"))
+    if reply is None:
+        return jsonify({"status": "error", "message": "Watcher is not running"}), 503
+    return jsonify(reply), 200 if reply.get("ok") else 400
+
+def open_db():
+    """Read-only connection to the watcher's history database"""
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+
+def load_heartbeat():
+    """Latest heartbeat written by the watcher after every poll, or None before the first one"""
+    try:
+        return HEARTBEAT.get()
+    except (OSError, ValueError):
+        return None
+
+def current_status():
+    heartbeat = load_heartbeat()
+    if heartbeat is None:
+        return {
+            "state_file_exists": os.path.exists(DB_PATH),
+            "status": "waiting_for_first_run"
+        }
+
+    age_seconds = int(time.time() - heartbeat["ts"])
+    if heartbeat.get("status") == "stopped":
+        # Written once on a clean shutdown, so its age says nothing about a stall
+        return {
+            "state_file_exists": os.path.exists(DB_PATH),
+            "last_update_seconds_ago": age_seconds,
+            "watcher_status": "stopped",
+            "last_error": None,
+            "next_poll_seconds": 0,
+            "status": "stopped"
+        }
+    # Allow a couple of missed polls before calling it stalled
+    expected = float(heartbeat.get("next_poll_seconds") or 15)
+    stalled = age_seconds > max(60, 3 * expected)
+    return {
+        "state_file_exists": os.path.exists(DB_PATH),
+        "last_update_seconds_ago": age_seconds,
+        "watcher_status": heartbeat.get("status"),
+        "last_error": heartbeat.get("error"),
+        "next_poll_seconds": expected,
+        "status": "possibly_stalled" if stalled else "running"
+    }
+
 @app.route("/api/status", methods=["GET"])
 def get_status():
-    """Check if watcher is working by looking at state file modification time"""
+    """Check if watcher is working from the heartbeat it writes every poll"""
     try:
-        if os.path.exists(STATE_PATH):
-            mtime = os.path.getmtime(STATE_PATH)
-            age_seconds = int(time.time() - mtime)
-            return jsonify({
-                "state_file_exists": True,
-                "last_update_seconds_ago": age_seconds,
-                "status": "running" if age_seconds < 60 else "possibly_stalled"
-            })
-        else:
-            return jsonify({
-                "state_file_exists": False,
-                "status": "waiting_for_first_run"
-            })
+        return jsonify(current_status())
     except Exception as e:
         return jsonify({"error": str(e), "status": "error"})
 
-@app.route("/")
-def index():
-    return """
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of the watcher's latest metrics snapshot"""
+    heartbeat = load_heartbeat() or {}
+    body = heartbeat.get("metrics", "")
+    if heartbeat:
+        body += "# HELP axebch_heartbeat_age_seconds Seconds since the watcher's last poll.\n"
+        body += "# TYPE axebch_heartbeat_age_seconds gauge\n"
+        body += f"axebch_heartbeat_age_seconds {time.time() - heartbeat['ts']:.3f}\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+class EventHub:
+    """Receives the watcher's event datagrams and fans them out to SSE subscribers"""
+
+    QUEUE_SIZE = 100
+
+    def __init__(self, path, max_subscribers):
+        self.path = path
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        self.thread = threading.Thread(target=self._listen, args=(sock,), name="events", daemon=True)
+        self.thread.start()
+
+    def _listen(self, sock):
+        while True:
+            data = sock.recv(65536)
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if event.get("type") == "workers":
+                WORKERS.apply(event)
+                # Browsers only need to know the leaderboard moved, not the rows
+                event = {"type": "workers", "pool": event.get("pool"), "seq": event.get("seq")}
+            self.broadcast(event)
+
+    def broadcast(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # slow client; it will resync from /api/status
+
+    def subscribe(self):
+        """A queue of future events, or None when every SSE slot is taken"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            q = queue.Queue(self.QUEUE_SIZE)
+            self.subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+
+class WorkerIndex:
+    """Leaderboard of every watched worker, kept sorted as the watcher reports changes.
+
+    The watcher pushes the rows that changed after each poll as "workers"
+    events. Applying one moves only those workers within lists that are kept
+    in order with bisect, per ORDERED sort and per pool, so a request is a
+    slice of an already sorted list. Last share changes on nearly every poll,
+    so it is only stored and ranked when asked for, with a partial heap sort.
+    Name-prefix filters use a sorted name list. A gap in
+    a pool's sequence numbers (or no data yet) triggers a full resync over the
+    control socket; events arriving meanwhile are replayed on top of it.
+    """
+
+    SORTS = ("best", "progress", "last_share")
+    ORDERED = ("best", "progress")
+    RESYNC_SECONDS = 300
+    MAX_PENDING = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.workers = {}  # (pool, name) -> [display, best, hashrate, last share ts, first seen]
+        self.keys = {}  # (pool, name) -> sort keys, same order as ORDERED
+        self.orders = {}  # (sort, pool or None) -> sorted keys, first entry ranks highest
+        self.names = []  # sorted (lowercase name, pool, name)
+        self.difficulty = {}
+        self.seq = {}
+        self.stale = True
+        self.pending = []
+        self.synced_at = 0.0
+
+    @staticmethod
+    def _key(value, pool, name):
+        # Negated so ascending lists rank highest first; unknown values sort last
+        return (-value if value is not None else float("inf"), pool, name)
+
+    def _keys(self, pool, name, worker):
+        best = worker[1]
+        difficulty = self.difficulty.get(pool)
+        progress = best / difficulty if difficulty else None
+        return self._key(best, pool, name), self._key(progress, pool, name)
+
+    def _insert(self, pool, name, worker):
+        keys = self._keys(pool, name, worker)
+        self.workers[(pool, name)] = worker
+        self.keys[(pool, name)] = keys
+        for sort, key in zip(self.ORDERED, keys):
+            bisect.insort(self.orders.setdefault((sort, None), []), key)
+            bisect.insort(self.orders.setdefault((sort, pool), []), key)
+        bisect.insort(self.names, (name.lower(), pool, name))
+
+    def _remove(self, pool, name):
+        keys = self.keys.pop((pool, name), None)
+        if keys is None:
+            return
+        del self.workers[(pool, name)]
+        for sort, key in zip(self.ORDERED, keys):
+            for scope in (None, pool):
+                order = self.orders[(sort, scope)]
+                del order[bisect.bisect_left(order, key)]
+        del self.names[bisect.bisect_left(self.names, (name.lower(), pool, name))]
+
+    def _apply(self, event):
+        pool = event["pool"]
+        difficulty = event.get("network_difficulty")
+        if difficulty and difficulty != self.difficulty.get(pool):
+            # Progress of every worker in the pool moves; rare, so simply re-insert them
+            self.difficulty[pool] = difficulty
+            for (p, name), worker in list(self.workers.items()):
+                if p == pool:
+                    self._remove(pool, name)
+                    self._insert(pool, name, worker)
+        for name in event.get("removed", []):
+            self._remove(pool, name)
+        for name, display, best, hashrate, last_share, first_seen in event.get("rows", []):
+            worker = [display, best, hashrate, last_share, first_seen]
+            old = self.workers.get((pool, name))
+            if old is not None and old[1] == best:
+                self.workers[(pool, name)] = worker  # hashrate or last share moved; order is unchanged
+                continue
+            self._remove(pool, name)
+            self._insert(pool, name, worker)
+        self.seq[pool] = event["seq"]
+
+    def apply(self, event):
+        """One "workers" event from the watcher"""
+        with self.lock:
+            if self.stale:
+                if len(self.pending) < self.MAX_PENDING:
+                    self.pending.append(event)
+                return
+            if event.get("seq") != self.seq.get(event.get("pool"), 0) + 1:
+                self.stale = True
+                self.pending = [event]
+                return
+            self._apply(event)
+
+    def replace(self, pools):
+        """Rebuild from a full snapshot, then replay the events that arrived after it"""
+        with self.lock:
+            self.workers, self.keys, self.names = {}, {}, []
+            self.orders = {}
+            self.difficulty = {pool: snapshot.get("network_difficulty") for pool, snapshot in pools.items()}
+            self.seq = {pool: snapshot["seq"] for pool, snapshot in pools.items()}
+            for pool, snapshot in pools.items():
+                for name, display, best, hashrate, last_share, first_seen in snapshot["rows"]:
+                    worker = [display, best, hashrate, last_share, first_seen]
+                    keys = self._keys(pool, name, worker)
+                    self.workers[(pool, name)] = worker
+                    self.keys[(pool, name)] = keys
+                    for sort, key in zip(self.ORDERED, keys):
+                        self.orders.setdefault((sort, None), []).append(key)
+                        self.orders.setdefault((sort, pool), []).append(key)
+                    self.names.append((name.lower(), pool, name))
+            for order in self.orders.values():
+                order.sort()
+            self.names.sort()
+            pending, self.pending = self.pending, []
+            self.stale = False
+            for event in pending:
+                seq, last = event.get("seq"), self.seq.get(event.get("pool"), 0)
+                if seq is None or seq <= last:
+                    continue
+                if seq != last + 1:
+                    self.stale = True
+                    break
+                self._apply(event)
+            self.synced_at = time.monotonic()
+
+    def sync(self):
+        """Resync from the watcher if the index is stale or due a periodic check; False if it could not"""
+        if not self.stale and time.monotonic() - self.synced_at < self.RESYNC_SECONDS:
+            return True
+        with self.sync_lock:
+            if not self.stale and time.monotonic() - self.synced_at < self.RESYNC_SECONDS:
+                return True
+            reply = control_request("workers", timeout=10.0)
+            if reply is None or not reply.get("ok"):
+                return False
+            self.replace(reply["pools"])
+            return True
+
+    def _sort_key(self, sort, pool, name):
+        if sort == "last_share":
+            return self._key(self.workers[(pool, name)][3], pool, name)
+        return self.keys[(pool, name)][self.ORDERED.index(sort)]
+
+    def query(self, sort="best", ascending=False, offset=0, limit=50, prefix="", pool=None):
+        now = time.time()
+        with self.lock:
+            if prefix:
+                low = prefix.lower()
+                start = bisect.bisect_left(self.names, (low,))
+                end = bisect.bisect_left(self.names, (low + "\U0010ffff",))
+                matches = [(p, name) for _, p, name in self.names[start:end] if pool is None or p == pool]
+            elif sort not in self.ORDERED:
+                matches = [key for key in self.workers if pool is None or key[0] == pool]
+            else:
+                matches = None
+            if matches is not None:
+                # Only the requested page needs ranking
+                total = len(matches)
+                pick = heapq.nlargest if ascending else heapq.nsmallest
+                page = pick(offset + limit, (self._sort_key(sort, p, name) for p, name in matches))[offset:]
+            else:
+                keys = self.orders.get((sort, pool), [])
+                total = len(keys)
+                if ascending:
+                    page = keys[max(total - offset - limit, 0):max(total - offset, 0)][::-1]
+                else:
+                    page = keys[offset:offset + limit]
+            rows = []
+            for _, p, name in page:
+                display, best, hashrate, last_share, first_seen = self.workers[(p, name)]
+                difficulty = self.difficulty.get(p)
+                rows.append({
+                    "pool": p,
+                    "worker": name,
+                    "display": display,
+                    "bestever": best,
+                    "progress": best / difficulty if difficulty else None,
+                    "hashrate": hashrate,
+                    "last_share_ago_s": max(now - last_share, 0) if last_share is not None else None,
+                    "first_seen": first_seen,
+                })
+        return {"total": total, "offset": offset, "limit": limit, "sort": sort, "workers": rows}
+
+
+WORKERS = WorkerIndex()
+
+# Each open stream holds a server thread, so leave some for regular requests
+EVENTS = EventHub(EVENTS_SOCKET, max_subscribers=int(os.getenv("SSE_MAX_CLIENTS", "4")))
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = 300  # browsers reconnect on their own; frees threads from abandoned tabs
+
+def sse_message(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/api/events", methods=["GET"])
+def events():
+    """Server-Sent Events stream of watcher heartbeats, ATHs and errors"""
+    subscriber = EVENTS.subscribe()
+    if subscriber is None:
+        return jsonify({"error": "too many live clients, poll /api/status instead"}), 503
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            yield sse_message("status", current_status())
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_message(event.get("type", "message"), event)
+        finally:
+            EVENTS.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.route("/api/history", methods=["GET"])
+def get_history():
+    """Most recent ATH events, optionally for a single worker"""
+    limit = max(1, min(request.args.get("limit", 50, type=int), 1000))
+    if not os.path.exists(DB_PATH):
+        return jsonify({"events": []})
+    query = "SELECT ts, pool, worker, display, previous, bestever, network_difficulty FROM ath_events"
+    conditions = []
+    params = []
+    for column in ("pool", "worker"):
+        value = request.args.get(column)
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    conn = open_db()
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+    keys = ("ts", "pool", "worker", "display", "previous", "bestever", "network_difficulty")
+    return jsonify({"events": [dict(zip(keys, row)) for row in rows]})
+
+@app.route("/api/workers", methods=["GET"])
+def get_workers():
+    """Worker leaderboard: ?sort=best|progress|last_share&order=asc|desc&prefix=&pool=&offset=&limit="""
+    sort = request.args.get("sort", "best")
+    if sort not in WorkerIndex.SORTS:
+        return jsonify({"error": f"unknown sort {sort}", "sorts": list(WorkerIndex.SORTS)}), 400
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    synced = WORKERS.sync()
+    result = WORKERS.query(sort, request.args.get("order") == "asc", offset, limit,
+                           request.args.get("prefix", ""), request.args.get("pool") or None)
+    result["stale"] = not synced
+    return jsonify(result)
+
+# Layout of the watcher's series file; see SeriesStore in watcher.py
+SERIES_MAGIC = b"AXSERIES"
+SERIES_HEADER = struct.Struct("<8sIIII")
+SERIES_HEADER_SIZE = 128
+SERIES_TIER = struct.Struct("<II")
+SERIES_NAME_BYTES = 112
+SERIES_LONG_NAME = b"\xffsha256:"
+SERIES_FIELDS = 4
+SERIES_TIER_LABELS = {0: "raw", 60: "1m", 3600: "1h", 86400: "1d"}
+
+def series_label(name):
+    """Slot label of a worker name, as SeriesStore.label() writes it"""
+    encoded = name.encode("utf-8")
+    if len(encoded) <= SERIES_NAME_BYTES:
+        return encoded
+    return SERIES_LONG_NAME + hashlib.sha256(encoded).hexdigest().encode("ascii")
+
+def read_series(name):
+    """Chronological samples per tier for one worker, or None if it has no series"""
+    if not os.path.exists(SERIES_PATH):
+        return None
+    with open(SERIES_PATH, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < SERIES_HEADER_SIZE:
+            return None
+        mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    try:
+        magic, _, slot_size, slot_count, tier_count = SERIES_HEADER.unpack_from(mm, 0)
+        if magic != SERIES_MAGIC:
+            return None
+        tiers = [SERIES_TIER.unpack_from(mm, SERIES_HEADER.size + i * SERIES_TIER.size) for i in range(tier_count)]
+        wanted = series_label(name)
+        slot_count = min(slot_count, (size - SERIES_HEADER_SIZE) // slot_size)
+
+        for slot in range(slot_count):
+            base = SERIES_HEADER_SIZE + slot * slot_size
+            stored = mm[base:base + SERIES_NAME_BYTES].rstrip(b"\0")
+            if stored != wanted:
+                continue
+
+            result = {}
+            ring = base + SERIES_NAME_BYTES + SERIES_TIER.size * tier_count
+            for t, (width, capacity) in enumerate(tiers):
+                head, count = SERIES_TIER.unpack_from(mm, base + SERIES_NAME_BYTES + t * SERIES_TIER.size)
+                entry_size = SERIES_FIELDS * 8
+                points = []
+                for i in range(count):
+                    index = (head - count + i) % capacity
+                    ts, best, rate_sum, samples = struct.unpack_from("<4d", mm, ring + index * entry_size)
+                    points.append([ts, best, rate_sum / samples if samples else None])
+                result[SERIES_TIER_LABELS.get(width, f"{width}s")] = points
+                ring += capacity * entry_size
+            return result
+        return None
+    finally:
+        mm.close()
+
+@app.route("/api/workers/<path:name>/series", methods=["GET"])
+def get_worker_series(name):
+    """Best share and hashrate history for one worker: [timestamp, best, hashrate] per point"""
+    pool = request.args.get("pool", DEFAULT_POOL)
+    series = read_series(name if pool == DEFAULT_POOL else f"{pool}/{name}")
+    if series is None:
+        return jsonify({"error": "unknown worker"}), 404
+    tier = request.args.get("tier")
+    if tier:
+        if tier not in series:
+            return jsonify({"error": f"unknown tier {tier}", "tiers": list(series)}), 400
+        series = {tier: series[tier]}
+    return jsonify({"pool": pool, "worker": name, "series": series})
+
+INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -145,6 +765,12 @@ def index():
             button:active {
                 transform: translateY(0);
             }
+            button.secondary {
+                margin-top: 10px;
+                background: white;
+                color: #667eea;
+                border: 2px solid #667eea;
+            }
             .alert {
                 padding: 12px 16px;
                 border-radius: 8px;
@@ -198,6 +824,22 @@ def index():
                 <div id="status">Checking...</div>
             </div>
             
+            <div class="card" id="analyticsCard" style="display: none;">
+                <h3>🎲 Mining Luck</h3>
+                <div id="analytics"></div>
+            </div>
+            
+            <div class="card" id="workersCard" style="display: none;">
+                <h3>🏆 Workers</h3>
+                <select id="workerSort" onchange="loadWorkers()">
+                    <option value="best">Best share</option>
+                    <option value="progress">Progress to block</option>
+                    <option value="last_share">Last share</option>
+                </select>
+                <input type="search" id="workerPrefix" placeholder="Filter by name" oninput="loadWorkers()" />
+                <div id="workers"></div>
+            </div>
+            
             <form id="settingsForm" onsubmit="return false;">
                 <div class="form-group">
                     <label for="webhook">Discord Webhook URL *</label>
@@ -235,6 +877,7 @@ def index():
                 </div>
                 
                 <button type="submit" onclick="save()">💾 Save Settings</button>
+                <button type="button" class="secondary" onclick="testWebhook()">🔔 Send Test Message</button>
             </form>
         </div>
         
@@ -259,35 +902,187 @@ def index():
                 }
             }
             
+            function renderStatus(data) {
+                const statusDiv = document.getElementById('status');
+
+                if (data.status === 'running' && data.watcher_status === 'error') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-error">⚠️ Pool API error</span>
+                        <div class="help-text" style="margin-top: 8px;">Last poll: ${data.last_update_seconds_ago}s ago. ${data.last_error || ''}</div>
+                    `;
+                } else if (data.status === 'running' && data.watcher_status === 'waiting_for_webhook') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-waiting">⏳ Waiting for webhook</span>
+                        <div class="help-text" style="margin-top: 8px;">Save a Discord webhook URL to start polling.</div>
+                    `;
+                } else if (data.status === 'running') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-running">✅ Running</span>
+                        <div class="help-text" style="margin-top: 8px;">Last poll: ${data.last_update_seconds_ago}s ago</div>
+                    `;
+                } else if (data.status === 'waiting_for_first_run') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-waiting">⏳ Waiting for first poll</span>
+                        <div class="help-text" style="margin-top: 8px;">Watcher is starting up...</div>
+                    `;
+                } else if (data.status === 'stopped') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-waiting">⏹ Stopped</span>
+                        <div class="help-text" style="margin-top: 8px;">Watcher shut down ${data.last_update_seconds_ago}s ago.</div>
+                    `;
+                } else if (data.status === 'possibly_stalled') {
+                    statusDiv.innerHTML = `
+                        <span class="status-badge status-error">⚠️ Possibly Stalled</span>
+                        <div class="help-text" style="margin-top: 8px;">Last poll: ${data.last_update_seconds_ago}s ago. Check logs.</div>
+                    `;
+                } else {
+                    statusDiv.innerHTML = `<span class="status-badge status-error">❌ Unknown</span>`;
+                }
+            }
+
             async function loadStatus() {
                 try {
                     const res = await fetch('/api/status');
-                    const data = await res.json();
-                    const statusDiv = document.getElementById('status');
-                    
-                    if (data.status === 'running') {
-                        statusDiv.innerHTML = `
-                            <span class="status-badge status-running">✅ Running</span>
-                            <div class="help-text" style="margin-top: 8px;">Last activity: ${data.last_update_seconds_ago}s ago</div>
-                        `;
-                    } else if (data.status === 'waiting_for_first_run') {
-                        statusDiv.innerHTML = `
-                            <span class="status-badge status-waiting">⏳ Waiting for first poll</span>
-                            <div class="help-text" style="margin-top: 8px;">Watcher is starting up...</div>
-                        `;
-                    } else if (data.status === 'possibly_stalled') {
-                        statusDiv.innerHTML = `
-                            <span class="status-badge status-error">⚠️ Possibly Stalled</span>
-                            <div class="help-text" style="margin-top: 8px;">Last activity: ${data.last_update_seconds_ago}s ago. Check logs.</div>
-                        `;
-                    } else {
-                        statusDiv.innerHTML = `<span class="status-badge status-error">❌ Unknown</span>`;
-                    }
+                    renderStatus(await res.json());
                 } catch (e) {
                     document.getElementById('status').innerHTML = 
                         '<span class="status-badge status-error">❌ Error loading status</span>';
                 }
             }
+
+            function formatDuration(seconds) {
+                if (!seconds) return '—';
+                const units = [['y', 31536000], ['d', 86400], ['h', 3600], ['m', 60]];
+                for (const [unit, size] of units) {
+                    if (seconds >= size) return (seconds / size).toFixed(1) + unit;
+                }
+                return Math.round(seconds) + 's';
+            }
+
+            async function loadAnalytics() {
+                const card = document.getElementById('analyticsCard');
+                try {
+                    const res = await fetch('/api/analytics');
+                    if (!res.ok) {
+                        card.style.display = 'none';
+                        return;
+                    }
+                    const data = await res.json();
+                    const farm = data.farm;
+                    const odds = Object.entries(farm.block_odds)
+                        .map(([days, p]) => `${days}: <b>${(p * 100).toFixed(2)}%</b>`).join(' · ');
+                    const luck = Object.values(data.pools).map(p => p.luck_quantiles.p50).filter(v => v != null);
+                    document.getElementById('analytics').innerHTML = `
+                        <div>Expected time to block: <b>${formatDuration(farm.expected_block_seconds)}</b> across ${farm.workers} workers</div>
+                        <div class="help-text">Chance of a block within ${odds}</div>
+                        ${luck.length ? `<div class="help-text">Median worker luck: ${luck.map(v => v.toFixed(0) + 'th percentile').join(', ')}</div>` : ''}
+                    `;
+                    card.style.display = 'block';
+                } catch (e) {
+                    card.style.display = 'none';
+                }
+            }
+
+            function escapeHtml(text) {
+                const div = document.createElement('div');
+                div.textContent = text;
+                return div.innerHTML;
+            }
+
+            async function loadWorkers() {
+                const card = document.getElementById('workersCard');
+                const params = new URLSearchParams({
+                    sort: document.getElementById('workerSort').value,
+                    prefix: document.getElementById('workerPrefix').value,
+                    limit: 10,
+                });
+                try {
+                    const res = await fetch('/api/workers?' + params);
+                    const data = await res.json();
+                    if (!res.ok || (!data.total && !params.get('prefix'))) {
+                        card.style.display = 'none';
+                        return;
+                    }
+                    document.getElementById('workers').innerHTML = data.workers.map(w => `
+                        <div>${escapeHtml(w.display)}: <b>${w.bestever.toLocaleString()}</b>
+                            ${w.progress != null ? ` · ${(w.progress * 100).toFixed(4)}% of block` : ''}
+                            ${w.last_share_ago_s != null ? ` · last share ${formatDuration(Math.max(w.last_share_ago_s, 1))} ago` : ''}</div>
+                    `).join('') + `<div class="help-text">${data.total} worker(s)</div>`;
+                    card.style.display = 'block';
+                } catch (e) {
+                    card.style.display = 'none';
+                }
+            }
+
+            // Live updates over SSE; fall back to polling if the stream is unavailable
+            let pollTimer = null;
+            let staleTimer = null;
+            let workersTimer = null;
+
+            function startPolling() {
+                if (!pollTimer) {
+                    pollTimer = setInterval(() => { loadStatus(); loadWorkers(); }, 10000);
+                }
+            }
+
+            function workersChanged() {
+                // Several pools can report in one burst; reload the leaderboard once
+                if (!workersTimer) {
+                    workersTimer = setTimeout(() => { workersTimer = null; loadWorkers(); }, 2000);
+                }
+            }
+
+            function expectHeartbeat(seconds) {
+                // No heartbeat within a few poll intervals: ask the backend, which reports stalls
+                clearTimeout(staleTimer);
+                staleTimer = setTimeout(loadStatus, Math.max(60, 3 * seconds) * 1000);
+            }
+
+            function subscribe() {
+                if (!window.EventSource) {
+                    startPolling();
+                    return;
+                }
+                const source = new EventSource('/api/events');
+                source.addEventListener('status', (e) => {
+                    const data = JSON.parse(e.data);
+                    renderStatus(data);
+                    expectHeartbeat(data.next_poll_seconds || 15);
+                });
+                source.addEventListener('heartbeat', (e) => {
+                    const hb = JSON.parse(e.data);
+                    if (hb.status === 'stopped') {
+                        clearTimeout(staleTimer);
+                        renderStatus({status: 'stopped', last_update_seconds_ago: 0});
+                        return;
+                    }
+                    renderStatus({
+                        status: 'running',
+                        watcher_status: hb.status,
+                        last_error: hb.error,
+                        last_update_seconds_ago: 0
+                    });
+                    expectHeartbeat(hb.next_poll_seconds || 15);
+                });
+                source.addEventListener('workers', workersChanged);
+                source.addEventListener('ath', (e) => {
+                    const ath = JSON.parse(e.data);
+                    showAlert(`🔥 ${ath.display} hit a new best share: ${ath.bestever}`, 'success');
+                });
+                source.addEventListener('farm_best', (e) => {
+                    const best = JSON.parse(e.data);
+                    showAlert(`🏆 ${best.display} set a new farm-wide best share: ${best.bestever}`, 'success');
+                });
+                source.addEventListener('open', () => {
+                    clearInterval(pollTimer);
+                    pollTimer = null;
+                });
+                source.addEventListener('error', () => {
+                    if (source.readyState === EventSource.CLOSED) {
+                        startPolling();
+                    }
+                });
+            }
             
             async function save() {
                 const webhook = document.getElementById('webhook').value.trim();
@@ -322,16 +1117,117 @@ def index():
                 }
             }
             
+            async function testWebhook() {
+                const webhook = document.getElementById('webhook').value.trim();
+                try {
+                    const res = await fetch('/api/webhook/test', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ discord_webhook: webhook })
+                    });
+                    const data = await res.json();
+                    showAlert(data.message, res.ok ? 'success' : 'error');
+                } catch (e) {
+                    showAlert('Test failed: ' + e.message, 'error');
+                }
+            }
+            
             // Load on page load
             loadSettings();
             loadStatus();
-            
-            // Refresh status every 10 seconds
-            setInterval(loadStatus, 10000);
+            loadAnalytics();
+            setInterval(loadAnalytics, 60000);
+            loadWorkers();
+            subscribe();
         </script>
     </body>
     </html>
     """
 
+
+class StaticAsset:
+    """A response body rendered once at startup with its strong ETag and compressed variants"""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.variants = {"identity": body.encode("utf-8")}
+        self.variants["gzip"] = gzip.compress(self.variants["identity"], compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.variants["identity"])
+        self.etag = hashlib.sha256(self.variants["identity"]).hexdigest()[:32]
+
+    def response(self):
+        headers = {
+            "ETag": f'"{self.etag}"',
+            "Cache-Control": "no-cache",  # always revalidate; unchanged pages cost a 304
+            "Vary": "Accept-Encoding",
+        }
+        if request.if_none_match.contains(self.etag):
+            return Response(status=304, headers=headers)
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in self.variants and candidate in request.accept_encodings:
+                encoding = candidate
+                break
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], mimetype=self.mimetype, headers=headers)
+
+
+INDEX_PAGE = StaticAsset(INDEX_HTML, "text/html")
+
+
+@app.route("/")
+def index():
+    return INDEX_PAGE.response()
+
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+
+
+@app.after_request
+def compress_response(response):
+    """gzip larger JSON and metrics responses when the client accepts it"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or "gzip" not in request.accept_encodings
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def serve():
+    """Run under waitress (multi-threaded WSGI) when available, else Flask's threaded server"""
+    try:
+        EVENTS.start()
+    except OSError as e:
+        print(f"[backend] live events disabled, cannot bind {EVENTS_SOCKET}: {e}")
+    host = os.getenv("BACKEND_HOST", "0.0.0.0")
+    port = int(os.getenv("BACKEND_PORT", "3001"))
+    mode = os.getenv("BACKEND_SERVER", "waitress")
+    if mode == "waitress":
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            print("[backend] waitress not installed, falling back to the threaded development server")
+        else:
+            threads = int(os.getenv("BACKEND_THREADS", "8"))
+            print(f"[backend] Serving on {host}:{port} with waitress ({threads} threads)")
+            waitress_serve(app, host=host, port=port, threads=threads)
+            return
+    app.run(host=host, port=port, threaded=True)
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=3001)
+    serve()
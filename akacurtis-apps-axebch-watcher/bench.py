@@ -0,0 +1,482 @@
+"""Offline benchmark for the ATH watcher.
+
+Runs the real detection and notification path (PoolWatcher polls, the
+outbox and notification router) against local stubs instead of a live pool and
+Discord, polling as fast as possible, and reports polls/sec, per-stage
+latency percentiles and memory.
+
+    python bench.py run --workers 5000 --pools 2 --polls 200 --ath-rate 0.01
+    python bench.py run --replay snapshots.jsonl --json > baseline.json
+    python bench.py run --baseline baseline.json      # exit 1 on regression
+    python bench.py record http://umbrel.local:21212 --count 50 --out snapshots.jsonl
+    python bench.py serve --workers 1000              # stubs only, for a real watcher
+    python bench.py startup --repeat 5                # process start to first poll, per runtime
+
+`run` uses whatever the watcher finds installed (WATCHER_RUNTIME=stdlib to
+force the stdlib-only client); the stubs are stdlib.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+POOL_STATS = {
+    "network_difficulty": 600_000_000_000,
+    "network_height": 900_000,
+    "network_hashrate": 4.2e18,
+    "hashrate": 1.2e12,
+}
+
+
+class SyntheticPool:
+    """A farm of `workers` workers; on each request about `ath_rate` of them set a new best"""
+
+    def __init__(self, name: str, workers: int, ath_rate: float, seed: int):
+        self.rng = random.Random(f"{seed}:{name}")
+        self.names = [f"bitcoincash:qbench{i // 8:05d}{name}.rig{i}" for i in range(workers)]
+        self.bests = [self.rng.randint(1_000, 1_000_000) for _ in range(workers)]
+        self.rates = [f"{self.rng.uniform(0.4, 1.6):.2f}T" for _ in range(workers)]
+        self.ath_rate = ath_rate
+        self.generation = 0
+        self.body: Optional[bytes] = None
+
+    def next_body(self) -> Tuple[int, bytes]:
+        rng = self.rng
+        expected = len(self.bests) * self.ath_rate
+        count = min(len(self.bests), int(expected) + (rng.random() < expected % 1))
+        for i in rng.sample(range(len(self.bests)), count):
+            self.bests[i] += rng.randint(1, self.bests[i])
+        if count or self.body is None:
+            self.generation += 1
+            details = [
+                {"workername": name, "bestever": best, "hashrate1m": rate,
+                 "lastshare_ago_s": rng.randint(0, 120)}
+                for name, best, rate in zip(self.names, self.bests, self.rates)
+            ]
+            self.body = json.dumps({"workers": len(details), "workers_details": details}).encode()
+        return self.generation, self.body
+
+
+class ReplayPool:
+    """Serves recorded /api/pool/workers bodies in order, then repeats the last one"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.bodies = [line.strip() for line in f if line.strip()]
+        if not self.bodies:
+            raise SystemExit(f"{path}: no snapshots")
+        self.index = 0
+
+    def next_body(self) -> Tuple[int, bytes]:
+        generation = min(self.index, len(self.bodies) - 1)
+        self.index += 1
+        return generation, self.bodies[generation]
+
+
+class StubState:
+    """Everything both stub servers share, plus counters for the report"""
+
+    def __init__(self, args):
+        self.args = args
+        self.pools: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        self.stats = {"workers_requests": 0, "not_modified": 0, "webhook_requests": 0,
+                      "webhook_429": 0, "embeds": 0, "last_workers_at": 0.0}
+        for i in range(1, args.pools + 1):
+            name = f"p{i}"
+            if args.replay:
+                self.pools[name] = ReplayPool(args.replay)
+            else:
+                self.pools[name] = SyntheticPool(name, args.workers, args.ath_rate, args.seed)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms per response
+    disable_nagle_algorithm = True
+    state: StubState
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def send_body(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        state = self.state
+        parts = self.path.split("?")[0].strip("/").split("/", 1)
+        if self.path == "/stats":
+            with state.lock:
+                return self.send_body(200, json.dumps(state.stats).encode())
+        pool = state.pools.get(parts[0])
+        route = parts[1] if len(parts) > 1 else ""
+        if pool is None:
+            return self.send_body(404)
+        if route == "api/pool":
+            return self.send_body(200, json.dumps(POOL_STATS).encode())
+        if route != "api/pool/workers":
+            return self.send_body(404)
+
+        with state.lock:
+            state.stats["workers_requests"] += 1
+            state.stats["last_workers_at"] = time.time()
+            generation, body = pool.next_body()
+        etag = f'"{generation}"'
+        if self.headers.get("If-None-Match") == etag:
+            with state.lock:
+                state.stats["not_modified"] += 1
+            return self.send_body(304, headers={"ETag": etag})
+        self.send_body(200, body, {"ETag": etag})
+
+    def do_POST(self) -> None:
+        state = self.state
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path != "/webhook":
+            return self.send_body(404)
+        if state.args.webhook_latency:
+            time.sleep(state.args.webhook_latency)
+
+        with state.lock:
+            state.stats["webhook_requests"] += 1
+            every = state.args.rate_limit_every
+            limited = every > 0 and state.stats["webhook_requests"] % every == 0
+            if limited:
+                state.stats["webhook_429"] += 1
+            else:
+                state.stats["embeds"] += len(json.loads(body or b"{}").get("embeds", []))
+        if limited:
+            retry = state.args.retry_after
+            return self.send_body(429, json.dumps({"retry_after": retry}).encode(),
+                                  {"Retry-After": f"{retry:g}", "X-RateLimit-Remaining": "0",
+                                   "X-RateLimit-Reset-After": f"{retry:g}"})
+        self.send_body(204)
+
+
+def serve_stubs(args, conn=None) -> None:
+    """Run the stub pool API and stub webhook until killed; sends (pool_port, webhook_port) to conn"""
+    handler = type("Handler", (StubHandler,), {"state": StubState(args)})
+    pool_server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    webhook_server = ThreadingHTTPServer(("127.0.0.1", args.webhook_port), handler)
+    for server in (pool_server, webhook_server):
+        server.daemon_threads = True
+    threading.Thread(target=webhook_server.serve_forever, daemon=True).start()
+    ports = (pool_server.server_address[1], webhook_server.server_address[1])
+    if conn is not None:
+        conn.send(ports)
+        conn.close()
+    else:
+        print("[bench] pools: " + ", ".join(f"http://127.0.0.1:{ports[0]}/{name}" for name in handler.state.pools))
+        print(f"[bench] webhook: http://127.0.0.1:{ports[1]}/webhook")
+    pool_server.serve_forever()
+
+
+def start_stubs(args) -> Tuple[multiprocessing.Process, int, int]:
+    """Stubs run in their own process so generating responses does not compete for our GIL"""
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=serve_stubs, args=(args, child), daemon=True)
+    process.start()
+    pool_port, webhook_port = parent.recv()
+    return process, pool_port, webhook_port
+
+
+class StageRecorder:
+    """Keeps every observation of the watcher's histograms so exact percentiles can be reported"""
+
+    def __init__(self, metrics):
+        self.samples: Dict[str, List[float]] = {}
+        for histogram in vars(metrics).values():
+            if hasattr(histogram, "observe") and hasattr(histogram, "buckets"):
+                self._wrap(histogram)
+
+    def _wrap(self, histogram) -> None:
+        observe = histogram.observe
+        stage = histogram.name.replace("axebch_", "").replace("_seconds", "")
+
+        def recording(value, label_value=None):
+            key = f"{stage}:{label_value}" if label_value else stage
+            self.samples.setdefault(key, []).append(value)
+            observe(value, label_value)
+
+        histogram.observe = recording
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, values in sorted(self.samples.items()):
+            values = sorted(values)
+            out[key] = {"count": len(values), "p50_ms": percentile(values, 50) * 1000,
+                        "p95_ms": percentile(values, 95) * 1000, "p99_ms": percentile(values, 99) * 1000,
+                        "max_ms": values[-1] * 1000}
+        return out
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+WATCHER_FILES = (("SETTINGS_FILE", "settings.yml"), ("DB_FILE", "watcher.db"), ("SERIES_FILE", "series.bin"),
+                 ("OUTBOX_FILE", "outbox.jsonl"), ("STATE_FILE", "state.json"),
+                 ("HEARTBEAT_FILE", "heartbeat.json"), ("EVENTS_SOCKET", "events.sock"))
+
+
+def run(args) -> int:
+    stubs, pool_port, webhook_port = start_stubs(args)
+    data_dir = tempfile.mkdtemp(prefix="axebch-bench-")
+    pools = [{"name": f"p{i}", "url": f"http://127.0.0.1:{pool_port}/p{i}"} for i in range(1, args.pools + 1)]
+    settings = {"discord_webhook": f"http://127.0.0.1:{webhook_port}/webhook", "pools": pools,
+                "stream_workers": not args.no_stream}
+    # YAML is a superset of JSON, so the watcher reads this as its settings.yml
+    with open(os.path.join(data_dir, "settings.yml"), "w") as f:
+        json.dump(settings, f)
+    for var, name in WATCHER_FILES:
+        os.environ[var] = os.path.join(data_dir, name)
+    os.environ.setdefault("DELIVERY_BACKOFF_MIN", "0.1")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import watcher
+
+    recorder = StageRecorder(watcher.Metrics)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    store = watcher.HistoryStore(watcher.DB_FILE)
+    series = watcher.SeriesStore(watcher.SERIES_FILE)
+    outbox = watcher.NotificationOutbox(watcher.OUTBOX_FILE)
+    board = watcher.HeartbeatBoard()
+    executor = ThreadPoolExecutor(max_workers=watcher.HTTP_CONCURRENCY, thread_name_prefix="http")
+    polls = args.polls if not args.replay else len(ReplayPool(args.replay).bodies)
+
+    async def drive(pool_watcher) -> None:
+        for _ in range(polls):
+            await pool_watcher.poll()
+
+    async def poll_all() -> None:
+        await asyncio.gather(*(drive(watcher.PoolWatcher(pool["name"], store, series, outbox, board, executor))
+                               for pool in pools))
+
+    # The delivery thread keeps logging after the run, so the report gets the real stdout instead
+    out = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    watcher.NotificationRouter(outbox).start()
+    started = time.perf_counter()
+    asyncio.run(poll_all())
+    elapsed = time.perf_counter() - started
+
+    drain_started = time.perf_counter()
+    while len(outbox) and time.perf_counter() - drain_started < args.drain_timeout:
+        time.sleep(0.01)
+    drain = time.perf_counter() - drain_started
+
+    total_polls = polls * len(pools)
+    with urllib.request.urlopen(f"http://127.0.0.1:{webhook_port}/stats") as r:
+        stub_stats = json.load(r)
+    stubs.terminate()
+
+    report = {
+        "workers": args.workers if not args.replay else None,
+        "pools": len(pools),
+        "polls": total_polls,
+        "elapsed_s": round(elapsed, 3),
+        "polls_per_s": round(total_polls / elapsed, 2) if elapsed else None,
+        "aths": watcher.Metrics.aths.value() or 0,
+        "notifications": watcher.Metrics.notifications.value("discord") or 0,
+        "undelivered": len(outbox),
+        "drain_s": round(drain, 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": recorder.summary(),
+        "stubs": stub_stats,
+    }
+    if args.tracemalloc:
+        report["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=2), file=out)
+    else:
+        print_report(report, out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"[bench] REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+def startup(args) -> int:
+    """Time from spawning watcher.py to its first workers request, for each runtime"""
+    args.pools = 1
+    stubs, pool_port, webhook_port = start_stubs(args)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "watcher.py")
+    settings = {"discord_webhook": f"http://127.0.0.1:{webhook_port}/webhook",
+                "pools": [{"name": "p1", "url": f"http://127.0.0.1:{pool_port}/p1"}]}
+    results = {}
+    for runtime in args.runtimes.split(","):
+        times = []
+        for _ in range(args.repeat):
+            data_dir = tempfile.mkdtemp(prefix="axebch-startup-")
+            with open(os.path.join(data_dir, "settings.yml"), "w") as f:
+                json.dump(settings, f)
+            env = dict(os.environ, WATCHER_RUNTIME=runtime)
+            for var, name in WATCHER_FILES + (("CONTROL_SOCKET", "control.sock"), ("DIAGNOSTICS_DIR", "diagnostics")):
+                env[var] = os.path.join(data_dir, name)
+            spawned_at = time.time()
+            process = subprocess.Popen([sys.executable, script], env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            polled_at = None
+            while polled_at is None and time.time() - spawned_at < args.timeout and process.poll() is None:
+                time.sleep(0.005)
+                with urllib.request.urlopen(f"http://127.0.0.1:{webhook_port}/stats") as r:
+                    last = json.load(r)["last_workers_at"]
+                if last >= spawned_at:
+                    polled_at = last
+            process.terminate()
+            process.wait(timeout=30)
+            if polled_at is None:
+                print(f"[bench] {runtime}: no poll within {args.timeout}s (exit {process.returncode})", file=sys.stderr)
+                stubs.terminate()
+                return 1
+            times.append(polled_at - spawned_at)
+        times.sort()
+        results[runtime] = {"runs": len(times), "min_ms": round(times[0] * 1000, 1),
+                            "p50_ms": round(percentile(times, 50) * 1000, 1), "max_ms": round(times[-1] * 1000, 1)}
+    stubs.terminate()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"[bench] {'runtime':<10}{'runs':>6}{'min ms':>10}{'p50 ms':>10}{'max ms':>10}")
+        for runtime, r in results.items():
+            print(f"[bench] {runtime:<10}{r['runs']:>6}{r['min_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['max_ms']:>10.1f}")
+    return 0
+
+
+def print_report(report: Dict[str, Any], out=sys.stdout) -> None:
+    print(f"[bench] {report['polls']} polls across {report['pools']} pool(s) in {report['elapsed_s']}s "
+          f"= {report['polls_per_s']} polls/s", file=out)
+    print(f"[bench] ATHs {report['aths']:g}, delivered {report['notifications']:g}, "
+          f"undelivered {report['undelivered']}, drain {report['drain_s']}s", file=out)
+    memory = f"max RSS {report['max_rss_mb']} MB"
+    if "python_peak_mb" in report:
+        memory += f", Python peak {report['python_peak_mb']} MB"
+    print(f"[bench] {memory}", file=out)
+    print(f"[bench] {'stage':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=out)
+    for stage, s in report["stages"].items():
+        print(f"[bench] {stage:<24}{s['count']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}", file=out)
+    print(f"[bench] stubs {json.dumps(report['stubs'])}", file=out)
+
+
+# Stages faster than this are noise on a shared machine and never count as a regression
+NOISE_FLOOR_MS = 1.0
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any], tolerance: float) -> List[str]:
+    """Throughput, p95 latency and memory that got worse than the baseline by more than tolerance"""
+    regressions = []
+    if baseline.get("polls_per_s") and report["polls_per_s"] < baseline["polls_per_s"] * (1 - tolerance):
+        regressions.append(f"polls/s {report['polls_per_s']} vs {baseline['polls_per_s']}")
+    if baseline.get("max_rss_mb") and report["max_rss_mb"] > baseline["max_rss_mb"] * (1 + tolerance):
+        regressions.append(f"max RSS {report['max_rss_mb']} MB vs {baseline['max_rss_mb']} MB")
+    for stage, before in baseline.get("stages", {}).items():
+        after = report["stages"].get(stage)
+        if after is None or after["p95_ms"] < NOISE_FLOOR_MS:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {after['p95_ms']:.2f} ms vs {before['p95_ms']:.2f} ms")
+    return regressions
+
+
+def record(args) -> int:
+    """Save /api/pool/workers responses from a live pool, one per line, for --replay"""
+    url = f"{args.url.rstrip('/')}/api/pool/workers"
+    headers = {"Cookie": f"UMBREL_PROXY_TOKEN={args.proxy_token}"} if args.proxy_token else {}
+    with open(args.out, "w", encoding="utf-8") as out:
+        for i in range(args.count):
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as r:
+                data = json.load(r)
+            out.write(json.dumps(data, separators=(",", ":")) + "\n")
+            print(f"[bench] snapshot {i + 1}/{args.count}: {len(data.get('workers_details') or [])} workers")
+            if i + 1 < args.count:
+                time.sleep(args.interval)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_stub_options(p) -> None:
+        p.add_argument("--workers", type=int, default=1000, help="synthetic workers per pool")
+        p.add_argument("--pools", type=int, default=1)
+        p.add_argument("--ath-rate", type=float, default=0.01, help="fraction of workers setting a new best per poll")
+        p.add_argument("--replay", help="serve recorded snapshots (from `record`) instead of synthetic workers")
+        p.add_argument("--seed", type=int, default=1)
+        p.add_argument("--webhook-latency", type=float, default=0.0, help="seconds the stub webhook takes to answer")
+        p.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth webhook request with a 429")
+        p.add_argument("--retry-after", type=float, default=0.05, help="retry_after sent with stub 429s")
+
+    p = commands.add_parser("run", help="benchmark the watcher against the stubs")
+    add_stub_options(p)
+    p.add_argument("--polls", type=int, default=100, help="polls per pool (replay: one per snapshot)")
+    p.add_argument("--no-stream", action="store_true", help="benchmark with stream_workers: false")
+    p.add_argument("--drain-timeout", type=float, default=30.0, help="seconds to wait for the outbox to drain")
+    p.add_argument("--tracemalloc", action="store_true", help="also report peak Python allocations (slower)")
+    p.add_argument("--json", action="store_true", help="print the report as JSON (usable as --baseline)")
+    p.add_argument("--baseline", help="JSON report to compare against; exit 1 on regression")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    p.add_argument("--verbose", action="store_true", help="keep the watcher's own log output")
+    p.set_defaults(func=run, port=0, webhook_port=0)
+
+    p = commands.add_parser("serve", help="only run the stub pool API and webhook")
+    add_stub_options(p)
+    p.add_argument("--port", type=int, default=21212)
+    p.add_argument("--webhook-port", type=int, default=21213)
+    p.set_defaults(func=lambda args: serve_stubs(args) or 0)
+
+    p = commands.add_parser("startup", help="time watcher.py from process start to its first poll")
+    add_stub_options(p)
+    p.add_argument("--repeat", type=int, default=5, help="watcher starts per runtime")
+    p.add_argument("--runtimes", default="auto,stdlib", help="comma-separated WATCHER_RUNTIME values to compare")
+    p.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the first poll")
+    p.add_argument("--json", action="store_true", help="print the results as JSON")
+    p.set_defaults(func=startup, port=0, webhook_port=0)
+
+    p = commands.add_parser("record", help="save snapshots of a live pool for --replay")
+    p.add_argument("url", help="pool API base URL")
+    p.add_argument("--count", type=int, default=20)
+    p.add_argument("--interval", type=float, default=15.0)
+    p.add_argument("--proxy-token", default=os.getenv("UMBREL_PROXY_TOKEN", ""))
+    p.add_argument("--out", required=True)
+    p.set_defaults(func=record)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""The built-in settings.yml parser must read a file exactly as PyYAML does, or refuse it.
+
+Run from the repository root with `python -m pytest` (or `python -m unittest discover`).
+The round-trip tests need PyYAML and are skipped without it.
+"""
+
+import math
+import os
+import re
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import watcher  # noqa: E402
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+README = os.path.join(os.path.dirname(os.path.dirname(HERE)), "README.md")
+
+# What backend.update_settings() saves, alone and next to hand-added keys
+BACKEND_SETTINGS = [
+    {"discord_webhook": "", "poll_seconds": 15, "umbrel_app_base": ""},
+    {"discord_webhook": "https://discord.com/api/webhooks/123456789/AbC-dEf_gh", "poll_seconds": 30,
+     "umbrel_app_base": "http://umbrel.local:21212"},
+    {"discord_webhook": "https://discord.com/api/webhooks/1/x", "poll_seconds": 5,
+     "umbrel_app_base": "http://10.0.0.5:21212/", "ath_coalesce_seconds": 20, "ath_max_delay_seconds": 0,
+     "worker_evict_hours": 168, "stream_workers": False, "poll_idle_max_seconds": 600.5},
+    {"discord_webhook": "https://discord.com/api/webhooks/1/x", "poll_seconds": 15, "umbrel_app_base": "",
+     "pools": [{"name": "garage", "url": "http://umbrel.local:21212"},
+               {"name": "office", "url": "http://10.0.0.20:21212", "proxy_token": "tok: en #1", "poll_seconds": 30}],
+     "sinks": [{"name": "milestones", "type": "discord", "url": "https://discord.com/api/webhooks/2/y",
+                "rules": {"min_progress": 0.01}},
+               {"name": "rigs", "type": "http", "url": "https://example.com/hooks/axebch",
+                "headers": {"Authorization": "Bearer abc"}, "concurrency": 4,
+                "rules": {"pools": ["garage"], "workers": ["*.rig*"], "exclude_workers": ["*test*"]}},
+               {"type": "exec", "command": ["/bin/sh", "-c", "cat >> /data/aths.log"], "max_attempts": 10}]},
+    # Strings that look like other types or need quoting
+    {"discord_webhook": "yes", "umbrel_app_base": "0x1F", "poll_seconds": "15", "note": "it's: #here",
+     "multi": "first line\nsecond line", "padded": "  both  ", "empty": None, "unicode": "ünï ✓",
+     "long": " ".join(["lorem ipsum dolor"] * 20)},
+]
+
+# backend.py calls yaml.dump(data, f); the others are what a hand-run dump of the same data looks like
+DUMP_STYLES = [{}, {"default_flow_style": False}, {"indent": 4}, {"allow_unicode": True}, {"width": 20}]
+
+REFUSED = {
+    "block sequence where a value belongs": "x: -\n",
+    "sequence entry after a key": "x: - a\n",
+    "complex key indicator": "x: ? a\n",
+    "bare colon": "x: :\n",
+    "leading comma": "x: ,a\n",
+    "empty flow entry": "x: [a,,b]\n",
+    "two colons in a flow mapping": "x: {a: b: c}\n",
+    "text after a quoted scalar": 'x: "a" b\n',
+    "unterminated quote": "x: 'abc\n",
+    "anchor": "x: &a 1\ny: *a\n",
+    "tag": "x: !!str 1\n",
+    "literal block scalar": "x: |\n  text\n",
+    "folded block scalar": "x: >\n  text\n",
+    "date": "x: 2024-01-01\n",
+    "merge key": "x:\n  <<: {a: 1}\n",
+    "nested flow collection": "x: [a, [b]]\n",
+    "comment inside a plain multi-line scalar": "x: a\n# c\n  b\n",
+}
+
+
+def same(a, b):
+    """Equal, with NaN equal to itself and bool/int/float told apart"""
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def readme_yaml_blocks():
+    with open(README, encoding="utf-8") as f:
+        return re.findall(r"```yaml\n(.*?)```", f.read(), re.S)
+
+
+class ParseYamlSubsetTest(unittest.TestCase):
+
+    def test_implicit_types_follow_yaml_1_1(self):
+        parsed = watcher.parse_yaml_subset(
+            "a: yes\nb: Off\nc: ~\nd: 0x1F\ne: 017\nf: 1:30\ng: 1_000\nh: .inf\ni: 1e3\nj: 1.5e+3\nk: '1'\n")
+        self.assertTrue(same(parsed, {"a": True, "b": False, "c": None, "d": 31, "e": 15, "f": 90, "g": 1000,
+                                      "h": math.inf, "i": "1e3", "j": 1500.0, "k": "1"}))
+
+    def test_multi_line_scalars_fold(self):
+        parsed = watcher.parse_yaml_subset('a: one\n  two\n\n  three\nb: "x\\\n  y"\n')
+        self.assertEqual(parsed, {"a": "one two\nthree", "b": "xy"})
+
+    def test_flow_collections(self):
+        parsed = watcher.parse_yaml_subset("a: [rig*, 'it''s, ok', \"b\"]\nb: {Authorization: \"Bearer x\", n: 2}\n")
+        self.assertEqual(parsed, {"a": ["rig*", "it's, ok", "b"], "b": {"Authorization": "Bearer x", "n": 2}})
+
+    def test_refuses_what_it_does_not_support(self):
+        for label, text in REFUSED.items():
+            with self.subTest(label):
+                with self.assertRaises(ValueError):
+                    watcher.parse_yaml_subset(text)
+
+    @unittest.skipUnless(yaml, "PyYAML is not installed")
+    def test_refused_inputs_are_invalid_or_unsupported(self):
+        # Everything refused is either an error for PyYAML too, or a feature the subset leaves to it
+        invalid = ["block sequence where a value belongs", "sequence entry after a key", "complex key indicator",
+                   "bare colon", "leading comma", "empty flow entry", "two colons in a flow mapping",
+                   "text after a quoted scalar", "unterminated quote"]
+        for label in invalid:
+            with self.subTest(label):
+                with self.assertRaises(yaml.YAMLError):
+                    yaml.safe_load(REFUSED[label])
+
+    @unittest.skipUnless(yaml, "PyYAML is not installed")
+    def test_round_trips_what_the_backend_writes(self):
+        for n, settings in enumerate(BACKEND_SETTINGS):
+            for style in DUMP_STYLES:
+                with self.subTest(settings=n, style=style):
+                    text = yaml.dump(settings, **style)
+                    self.assertTrue(same(watcher.parse_yaml_subset(text), yaml.safe_load(text)), text)
+
+    @unittest.skipUnless(yaml, "PyYAML is not installed")
+    def test_flow_style_dumps_agree_or_refuse(self):
+        # Single-level flow collections are read; nested ones are refused rather than misread
+        for n, settings in enumerate(BACKEND_SETTINGS):
+            with self.subTest(settings=n):
+                text = yaml.dump(settings, default_flow_style=True)
+                try:
+                    parsed = watcher.parse_yaml_subset(text)
+                except ValueError:
+                    continue
+                self.assertTrue(same(parsed, yaml.safe_load(text)), text)
+
+    @unittest.skipUnless(yaml, "PyYAML is not installed")
+    def test_readme_examples(self):
+        blocks = readme_yaml_blocks()
+        self.assertTrue(blocks, "no yaml examples found in the README")
+        for block in blocks:
+            with self.subTest(block=block.splitlines()[0]):
+                self.assertTrue(same(watcher.parse_yaml_subset(block), yaml.safe_load(block)), block)
+
+
+if __name__ == "__main__":
+    unittest.main()
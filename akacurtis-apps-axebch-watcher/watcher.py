@@ -1,19 +1,519 @@
+import asyncio
 import os
+import sys
 import time
 import json
-import requests
-from typing import Any, Dict, List, Optional
-import yaml
+import codecs
+import math
+import mmap
+import re
+import socket
+import sqlite3
+import struct
+import threading
+import tracemalloc
+import fcntl
+import fnmatch
+import hashlib
+import shutil
+import signal
+import subprocess
+import http.client
+import urllib.parse
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter as Tally, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# "stdlib" runs on the standard library alone (http.client, a YAML subset parser);
+# "auto" uses requests and PyYAML when they are installed
+WATCHER_RUNTIME = os.getenv("WATCHER_RUNTIME", "auto")
+requests = None
+yaml = None
+if WATCHER_RUNTIME != "stdlib":
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+    except ImportError:
+        requests = None
+    try:
+        import yaml
+    except ImportError:
+        yaml = None
 
+# Imported by load_numpy() on the first analytics pass, keeping it off the startup path
+numpy = None
+_numpy_checked = False
 
-def load_settings():
-    """Load settings from the settings file"""
+
+def load_numpy():
+    """The numpy module, imported on first use; None when missing or WATCHER_RUNTIME=stdlib"""
+    global numpy, _numpy_checked
+    if not _numpy_checked and WATCHER_RUNTIME != "stdlib":
+        try:
+            import numpy
+        except ImportError:  # analytics fall back to plain Python loops
+            numpy = None
+        _numpy_checked = True
+    return numpy
+
+
+SETTINGS_FILE = os.getenv("SETTINGS_FILE", "/data/settings.yml")
+
+
+class _DirectoryWatch:
+    """Non-blocking inotify watch on a directory, filtered to one file name (Linux only)"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_IGNORED = 0x00008000
+    IN_Q_OVERFLOW = 0x00004000
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, fd: int, name: bytes):
+        self.fd = fd
+        self.name = name
+
+    @classmethod
+    def open(cls, path: str) -> Optional["_DirectoryWatch"]:
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = (cls.IN_MODIFY | cls.IN_CLOSE_WRITE | cls.IN_MOVED_FROM
+                    | cls.IN_MOVED_TO | cls.IN_CREATE | cls.IN_DELETE)
+            directory = os.path.dirname(os.path.abspath(path))
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return None
+            return cls(fd, os.fsencode(os.path.basename(path)))
+        except Exception:
+            return None
+
+    def changed(self) -> Optional[bool]:
+        """True if the file was touched since the last call, None if the watch is gone"""
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return hit
+            except OSError:
+                return None
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(buf):
+                _, mask, _, length = self.EVENT_HEADER.unpack_from(buf, offset)
+                offset += self.EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self.IN_IGNORED:
+                    return None
+                if mask & self.IN_Q_OVERFLOW or name == self.name:
+                    hit = True
+
+
+# Implicit types as PyYAML resolves them (YAML 1.1), so a settings.yml reads the same either way
+_YAML_INT = re.compile(r"""[-+]?(?:0b[0-1_]+|0[0-7_]+|(?:0|[1-9][0-9_]*)|0x[0-9a-fA-F_]+
+                           |[1-9][0-9_]*(?::[0-5]?[0-9])+)$""", re.X)
+_YAML_FLOAT = re.compile(r"""(?:[-+]?[0-9][0-9_]*\.[0-9_]*(?:[eE][-+][0-9]+)?|\.[0-9][0-9_]*(?:[eE][-+][0-9]+)?
+                           |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\.[0-9_]*|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN))$""", re.X)
+_YAML_TIMESTAMP = re.compile(r"""(?:[0-9]{4}-[0-9]{2}-[0-9]{2}|[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}(?:[Tt]|[ \t]+)[0-9]{1,2}
+                                 :[0-9]{2}:[0-9]{2}(?:\.[0-9]*)?(?:[ \t]*(?:Z|[-+][0-9]{1,2}(?::[0-9]{2})?))?)$""", re.X)
+_YAML_CONSTANTS = {
+    "null": None, "Null": None, "NULL": None, "~": None,
+    "true": True, "True": True, "TRUE": True, "yes": True, "Yes": True, "YES": True, "on": True, "On": True, "ON": True,
+    "false": False, "False": False, "FALSE": False, "no": False, "No": False, "NO": False, "off": False, "Off": False, "OFF": False,
+}
+
+
+_YAML_ESCAPES = {"0": "\0", "a": "\a", "b": "\b", "t": "\t", "\t": "\t", "n": "\n", "v": "\v", "f": "\f",
+                 "r": "\r", "e": "\x1b", " ": " ", '"': '"', "/": "/", "\\": "\\", "N": "\x85", "_": "\xa0",
+                 "L": "\u2028", "P": "\u2029"}
+_YAML_ESCAPE = re.compile(r'\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)', re.S)
+
+
+def _yaml_double_quoted(text: str) -> str:
+    def unescape(match):
+        code = match.group(1)
+        if len(code) > 1:
+            return chr(int(code[1:], 16))
+        return _YAML_ESCAPES.get(code, code)
+    return _YAML_ESCAPE.sub(unescape, text[1:-1])
+
+
+def _yaml_quote_end(text: str) -> int:
+    """Index of the quote closing the scalar text starts with, or -1"""
+    quote, i = text[0], 1
+    while i < len(text):
+        if quote == '"' and text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            if quote == "'" and text[i + 1:i + 2] == "'":
+                i += 2
+                continue
+            return i
+        i += 1
+    return -1
+
+
+def _yaml_strip_comment(line: str, quote: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """line without its comment, and the quote still open at its end (quote: open at its start)"""
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote:
+            if quote == '"' and char == "\\":
+                i += 1
+            elif char == quote:
+                if quote == "'" and line[i + 1:i + 2] == "'":
+                    i += 1
+                else:
+                    quote = None
+        elif char in "'\"" and (line[:i].rstrip()[-1:] or ":") in ":-[{," and (i == 0 or line[i - 1] in " \t[{,"):
+            quote = char
+        elif char == "#" and (i == 0 or line[i - 1] in " \t"):
+            return line[:i], None
+        i += 1
+    return line, quote
+
+
+def _yaml_split_key(text: str) -> Optional[Tuple[Any, str]]:
+    """(key, rest) if text is a "key: value" entry"""
+    if text[:1] in "'\"":
+        end = text.find(text[0], 1)
+        if end > 0 and text[end + 1:end + 2] == ":" and text[end + 2:end + 3] in ("", " "):
+            return _yaml_scalar(text[:end + 1]), text[end + 2:].lstrip()
+        return None
+    if text[:1] in "[{" or (text[:1] in "-?" and text[1:2] in ("", " ")):
+        return None  # a flow collection, sequence entry or complex key, never a plain key
+    index = text.find(": ")
+    if index < 0:
+        index = len(text) - 1 if text.endswith(":") else -1
+    if index <= 0:
+        return None  # an empty key is complex-key syntax, which PyYAML rejects here
+    return _yaml_scalar(text[:index].strip()), text[index + 2:].lstrip()
+
+
+def _yaml_int(text: str) -> int:
+    text = text.replace("_", "")
+    sign = -1 if text[0] == "-" else 1
+    text = text.lstrip("+-")
+    if text.startswith("0b"):
+        return sign * int(text[2:], 2)
+    if text.startswith("0x"):
+        return sign * int(text[2:], 16)
+    if ":" in text:
+        return sign * sum(int(part) * 60 ** n for n, part in enumerate(reversed(text.split(":"))))
+    return sign * int(text, 8 if len(text) > 1 and text[0] == "0" else 10)
+
+
+def _yaml_float(text: str) -> float:
+    text = text.replace("_", "").lower()
+    sign = -1.0 if text[0] == "-" else 1.0
+    text = text.lstrip("+-")
+    if text in (".inf", ".nan"):
+        return sign * float(text[1:])
+    if ":" in text:
+        return sign * sum(float(part) * 60 ** n for n, part in enumerate(reversed(text.split(":"))))
+    return sign * float(text)
+
+
+def _yaml_scalar(text: str) -> Any:
+    if not text:
+        return None
+    if text[0] in "'\"" and _yaml_quote_end(text) != len(text) - 1:
+        raise ValueError(f"unexpected text after a quoted scalar: {text}")
+    if text[0] == '"':
+        return _yaml_double_quoted(text)
+    if text[0] == "'":
+        return text[1:-1].replace("''", "'")
+    if text[0] in "[{":
+        try:
+            return json.loads(text)
+        except ValueError:
+            return _yaml_flow(text)
+    if text in _YAML_CONSTANTS:
+        return _YAML_CONSTANTS[text]
+    # Indicators a plain scalar cannot start with; PyYAML rejects these (e.g. "x: -", "x: ? a")
+    if text[0] in ",]}" or (text[0] in "-?:" and text[1:2] in ("", " ")):
+        raise ValueError(f"unexpected indicator: {text}")
+    # Rather than guess at anchors, tags, block scalars, merge keys or dates, leave those to PyYAML
+    if text[0] in "&*!|>%@`" or text in ("=", "<<") or ": " in text or text.endswith(":") \
+            or _YAML_TIMESTAMP.match(text):
+        raise ValueError(f"unsupported YAML (install PyYAML): {text}")
+    if _YAML_INT.match(text):
+        return _yaml_int(text)
+    if _YAML_FLOAT.match(text):
+        return _yaml_float(text)
+    return text
+
+
+def _yaml_flow_items(body: str) -> List[str]:
+    """Split the inside of a flow collection on its commas, skipping those in quotes"""
+    items, start, quote, i = [], 0, None, 0
+    while i < len(body):
+        char = body[i]
+        if quote:
+            if quote == '"' and char == "\\":
+                i += 1
+            elif char == quote:
+                if quote == "'" and body[i + 1:i + 2] == "'":
+                    i += 1
+                else:
+                    quote = None
+        elif char in "'\"" and body[start:i].rstrip()[-1:] in ("", ":"):
+            quote = char
+        elif char in "[]{}":
+            raise ValueError(f"unsupported nested flow collection: {body}")
+        elif char == ",":
+            items.append(body[start:i].strip())
+            start = i + 1
+        i += 1
+    if quote:
+        raise ValueError(f"unterminated quoted scalar: {body}")
+    last = body[start:].strip()
+    if last:
+        items.append(last)
+    if "" in items:
+        raise ValueError(f"empty entry in flow collection: {body}")
+    return items
+
+
+def _yaml_flow(text: str) -> Any:
+    """A single-level [a, 'b'] or {k: v} flow collection that is not valid JSON"""
+    if text[0] == "[" and text.endswith("]"):
+        items = _yaml_flow_items(text[1:-1])
+        if any(_yaml_flow_key(item) is not None for item in items):
+            raise ValueError(f"unsupported single-pair mapping in a flow sequence: {text}")
+        return [_yaml_scalar(item) for item in items]
+    if text[0] == "{" and text.endswith("}"):
+        mapping = {}
+        for item in _yaml_flow_items(text[1:-1]):
+            entry = _yaml_flow_key(item)
+            key, value = entry if entry is not None else (item, "")
+            mapping[_yaml_scalar(key)] = _yaml_scalar(value)
+        return mapping
+    raise ValueError(f"unsupported flow collection: {text}")
+
+
+def _yaml_flow_key(item: str) -> Optional[Tuple[str, str]]:
+    """(key, value) text of a "key: value" flow entry; any other ':' is left to PyYAML"""
+    if item[:1] in "'\"":
+        end = _yaml_quote_end(item)
+        if end < 0:
+            raise ValueError(f"unterminated quoted scalar: {item}")
+        rest = item[end + 1:].lstrip()
+        if not rest:
+            return None
+        if not rest.startswith(":"):
+            raise ValueError(f"unexpected text after a quoted scalar: {item}")
+        return item[:end + 1], rest[1:].strip()
+    if ":" not in item:
+        return None
+    key, _, value = item.partition(": ")
+    if not value and item.endswith(":"):
+        key = item[:-1]
+    if ":" in key or not key.strip() or (value and ":" in value.strip()[:1]):
+        raise ValueError(f"unsupported flow entry: {item}")
+    return key.strip(), value.strip()
+
+
+def _yaml_node(lines: List[List[Any]], pos: int, indent: int) -> Tuple[Any, int]:
+    """Parse the block starting at lines[pos] (indented by indent); returns (value, next position)"""
+    text = lines[pos][1]
+    if text == "-" or text.startswith("- "):
+        items = []
+        while pos < len(lines) and lines[pos][0] == indent and (lines[pos][1] == "-" or lines[pos][1].startswith("- ")):
+            rest = lines[pos][1][1:].lstrip()
+            if not rest:
+                if pos + 1 < len(lines) and lines[pos + 1][0] > indent:
+                    value, pos = _yaml_node(lines, pos + 1, lines[pos + 1][0])
+                else:
+                    value, pos = None, pos + 1
+            elif _yaml_split_key(rest) is not None or rest == "-" or rest.startswith("- "):
+                # "- key: value" opens a nested block whose first line starts after the dash
+                column = indent + len(lines[pos][1]) - len(rest)
+                lines[pos] = [column, rest] + lines[pos][2:]
+                value, pos = _yaml_node(lines, pos, column)
+            else:
+                value, pos = _yaml_value(lines, pos, indent, rest)
+            items.append(value)
+        return items, pos
+
+    if _yaml_split_key(text) is None:
+        return _yaml_value(lines, pos, indent - 1, text)  # a scalar on the line below its key
+
+    mapping: Dict[Any, Any] = {}
+    while pos < len(lines) and lines[pos][0] == indent:
+        entry = _yaml_split_key(lines[pos][1]) if lines[pos][3] is None else None
+        if entry is None:
+            if lines[pos][3] is None and (lines[pos][1] == "-" or lines[pos][1].startswith("- ")):
+                break
+            raise ValueError(f"expected 'key: value': {lines[pos][1]}")
+        key, rest = entry
+        if rest:
+            mapping[key], pos = _yaml_value(lines, pos, indent, rest)
+            continue
+        pos += 1
+        if pos < len(lines) and lines[pos][0] > indent:
+            mapping[key], pos = _yaml_node(lines, pos, lines[pos][0])
+        elif pos < len(lines) and lines[pos][0] == indent and (lines[pos][1] == "-" or lines[pos][1].startswith("- ")):
+            mapping[key], pos = _yaml_node(lines, pos, indent)  # sequences may sit at their key's indent
+        else:
+            mapping[key] = None
+    return mapping, pos
+
+
+def _yaml_value(lines: List[List[Any]], pos: int, indent: int, text: str) -> Tuple[Any, int]:
+    """A scalar plus any more-indented continuation lines, folded as YAML does:
+    a line break becomes a space and each blank line a newline"""
+    pos += 1
+    while pos < len(lines) and lines[pos][0] > indent:
+        _, line, breaks, quote, after_comment = lines[pos]
+        if text[:1] in "'\"" and quote is None:
+            raise ValueError(f"unexpected text after a quoted scalar: {line}")
+        if after_comment and quote is None:
+            raise ValueError(f"comment inside a multi-line scalar before: {line}")
+        escaped_break = quote == '"' and (len(text) - len(text.rstrip("\\"))) % 2 == 1
+        if escaped_break:
+            text = text[:-1] + "\n" * breaks + line
+        else:
+            text += ("\n" * breaks or " ") + line
+        pos += 1
+    return _yaml_scalar(text), pos
+
+
+def parse_yaml_subset(text: str) -> Any:
+    """The block-style YAML that yaml.dump writes and people type into settings.yml, without PyYAML.
+
+    Nested mappings and lists, flow [..] / {..} collections in JSON form,
+    plain, quoted and multi-line scalars, comments, with PyYAML's (YAML 1.1)
+    implicit types. Anchors, tags, block scalars (| and >), dates and multiple
+    documents raise ValueError instead.
+    """
+    # [indent, text, blank lines before it, quote open at its start, follows a comment line]
+    lines: List[List[Any]] = []
+    quote = None
+    breaks = 0
+    after_comment = False
+    for raw in text.splitlines():
+        opened = quote
+        line, quote = _yaml_strip_comment(raw.replace("\t", " "), quote)
+        stripped = line.rstrip()
+        if quote == '"' and (len(stripped) - len(stripped.rstrip("\\"))) % 2 == 1 and len(stripped) < len(line):
+            stripped = line[:len(stripped) + 1]  # an escaped space, not trailing whitespace
+        line = stripped
+        if not line.strip():
+            if opened or raw.strip() == "":
+                breaks += 1
+            else:
+                after_comment = True
+            continue
+        if opened is None and line.strip() in ("---", "..."):
+            continue
+        lines.append([len(line) - len(line.lstrip(" ")), line.lstrip(" "), breaks, opened, after_comment])
+        breaks = 0
+        after_comment = False
+    if quote is not None:
+        raise ValueError("unterminated quoted scalar")
+    if not lines:
+        return None
+    value, pos = _yaml_node(lines, 0, lines[0][0])
+    if pos < len(lines):
+        raise ValueError(f"unexpected indentation: {lines[pos][1]}")
+    return value
+
+
+def load_yaml(text: str) -> Any:
+    if yaml is not None:
+        return yaml.safe_load(text)
     try:
-        with open("/data/settings.yml", "r") as f:
-            return yaml.safe_load(f) or {}
-    except:
+        return json.loads(text)  # JSON is valid YAML, and what bench.py writes
+    except ValueError:
+        return parse_yaml_subset(text)
+
+
+class SettingsCache:
+    """Parsed settings.yml, re-read only when the file actually changes.
+
+    Uses inotify where available so an unchanged file costs one non-blocking
+    read() per lookup; otherwise compares (mtime, size, inode) from stat().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Dict[str, Any] = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self._watch = _DirectoryWatch.open(path)
+        self._stale = True
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._watch is not None:
+                changed = self._watch.changed()
+                if changed is None:
+                    os.close(self._watch.fd)
+                    self._watch = None
+                elif changed:
+                    self._stale = True
+                if self._watch is not None and not self._stale:
+                    return self._data
+
+            signature = self._stat_signature()
+            if self._stale or signature != self._signature:
+                self._data = self._parse()
+                self._signature = signature
+                self._stale = False
+            return self._data
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        """Install settings pushed over the control socket without waiting for the file event"""
+        with self._lock:
+            self._data = data if isinstance(data, dict) else {}
+            self._signature = self._stat_signature()
+            self._stale = False
+
+    def _parse(self) -> Dict[str, Any]:
+        # The backend keeps the previous version as settings.yml.bak
+        for path in (self.path, self.path + ".bak"):
+            try:
+                with open(path, "r") as f:
+                    data = load_yaml(f.read())
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"[watcher] Could not read {path}: {e}")
+                continue
+            if isinstance(data, dict):
+                return data
         return {}
 
+
+SETTINGS = SettingsCache(SETTINGS_FILE)
+
+
+def load_settings():
+    """Load settings from the settings file (cached until the file changes)"""
+    return SETTINGS.get()
+
 def get_webhook():
     """Get Discord webhook from settings"""
     return load_settings().get("discord_webhook", "")
@@ -25,6 +525,16 @@ def get_poll_seconds():
         return int(settings["poll_seconds"])
     return int(os.getenv("POLL_SECONDS", "15"))
 
+def get_poll_bounds(poll_seconds: float, pool: Optional[Dict[str, Any]] = None):
+    """Adaptive poll bounds: (fastest after activity, slowest when the API errors, slowest while idle)"""
+    settings = load_settings()
+    pool = pool or {}
+    min_seconds = float(pool.get("poll_min_seconds") or settings.get("poll_min_seconds") or max(1.0, poll_seconds / 3))
+    max_seconds = max(float(pool.get("poll_max_seconds") or settings.get("poll_max_seconds") or poll_seconds * 4),
+                      poll_seconds)
+    idle_max_seconds = float(pool.get("poll_idle_max_seconds") or settings.get("poll_idle_max_seconds") or max_seconds)
+    return min(min_seconds, poll_seconds), max_seconds, max(idle_max_seconds, poll_seconds)
+
 def get_base_url():
     """Get base URL from settings, fallback to env var"""
     settings = load_settings()
@@ -33,56 +543,1593 @@ def get_base_url():
     return os.getenv("UMBREL_APP_BASE", "http://umbrel.local:21212").rstrip("/")
 
 
-BASE = get_base_url()
 PROXY_TOKEN = os.getenv("UMBREL_PROXY_TOKEN", "").strip()
 
 STATE_FILE = os.getenv("STATE_FILE", "/data/state.json")
+DB_FILE = os.getenv("DB_FILE", "/data/watcher.db")
+SERIES_FILE = os.getenv("SERIES_FILE", "/data/series.bin")
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "/data/outbox.jsonl")
+
+# Pool stats are only needed to render an ATH; reuse them for about one block interval
+POOL_STATS_TTL = float(os.getenv("POOL_STATS_TTL", "600"))
+
+# HTTP client tuning: (connect, read) timeouts and keep-alive pool size per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "32"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "4"))
+# Blocking HTTP calls run on this many threads, shared by every pool
+HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "8"))
 
 # Note: PROXY_TOKEN check removed - will work without it
 # Webhook is checked dynamically via get_webhook()
-# BASE URL and POLL_SECONDS can be overridden in settings
+# The base URL and POLL_SECONDS can be overridden in settings
 
 
-def get_pool_url():
-    """Get pool URL dynamically"""
-    return f"{get_base_url()}/api/pool"
+DEFAULT_POOL = "default"
 
-def get_workers_url():
-    """Get workers URL dynamically"""
-    return f"{get_base_url()}/api/pool/workers"
 
+def get_pools() -> List[Dict[str, Any]]:
+    """Pools to watch: the `pools` list in settings, else the single umbrel_app_base pool.
 
-def load_state() -> Dict[str, Any]:
+    Each entry is a URL or a mapping with `url` and optional `name`,
+    `proxy_token`, `poll_seconds`, `poll_min_seconds`, `poll_max_seconds` and
+    `poll_idle_max_seconds`.
+    """
+    pools: List[Dict[str, Any]] = []
+    seen = set()
+    configured = load_settings().get("pools")
+    if isinstance(configured, list):
+        for i, entry in enumerate(configured, 1):
+            if isinstance(entry, str):
+                entry = {"url": entry}
+            if not isinstance(entry, dict) or not entry.get("url"):
+                continue
+            name = str(entry.get("name") or f"pool{i}").strip()
+            if name in seen:
+                continue
+            seen.add(name)
+            pool = dict(entry)
+            pool["name"] = name
+            pool["base_url"] = str(entry["url"]).rstrip("/")
+            pool.setdefault("proxy_token", PROXY_TOKEN)
+            pools.append(pool)
+    if not pools:
+        pools.append({"name": DEFAULT_POOL, "base_url": get_base_url(), "proxy_token": PROXY_TOKEN})
+    return pools
+
+
+def pool_worker_key(pool: str, worker: str) -> str:
+    """Name a worker is stored under outside the database (series, event ids)"""
+    return worker if pool == DEFAULT_POOL else f"{pool}/{worker}"
+
+
+def load_state(path: str = STATE_FILE) -> Dict[str, Any]:
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             d = json.load(f)
         return d if isinstance(d, dict) else {}
     except FileNotFoundError:
         return {}
-    except Exception:
+    except Exception as e:
+        print(f"[watcher] Ignoring unreadable {path}: {e}")
         return {}
 
 
-def save_state(state: Dict[str, Any]) -> None:
-    tmp = STATE_FILE + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(state, f)
-    os.replace(tmp, STATE_FILE)
+def fsync_dir(path: str) -> None:
+    """Make a rename or a new file in path's directory survive power loss"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Seconds between database commits; changes in between are buffered in memory (0 commits every poll)
+PERSIST_SECONDS = float(os.getenv("PERSIST_SECONDS", "30"))
+# Rolling, checksummed copies of watcher.db used to recover from a corrupt database at startup
+DB_BACKUP_HOURS = float(os.getenv("DB_BACKUP_HOURS", "6"))
+DB_BACKUP_GENERATIONS = int(os.getenv("DB_BACKUP_GENERATIONS", "2"))
+
+
+class HistoryStore:
+    """SQLite (WAL) store of per-worker bests plus an append-only ATH history.
+
+    Replaces rewriting state.json on every change. Polls only buffer the rows
+    that changed; flush() commits them in one transaction at most every
+    PERSIST_SECONDS and on shutdown, so an SD card sees a handful of writes a
+    minute however often pools are polled. Anything lost to a crash in
+    between is re-detected on the next poll, and the outbox keeps a
+    re-detected ATH from being announced twice. The backend opens the same
+    file read-only.
+
+    The event loop only ever buffers: flush() runs in a worker thread on its
+    own connection, and the lock is held just long enough to swap the buffers
+    out, so a slow fsync never stalls polling or the lease renewal. Reads
+    also see the batch being committed.
+    """
+
+    SCHEMA_VERSION = 2
+    # Flush early once this many rows are buffered
+    MAX_BUFFERED = 5000
+
+    def __init__(self, path: str, flush_interval: float = PERSIST_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._new: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (pool, name) -> (best, first seen)
+        self._bests: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (pool, name) -> (best, updated at)
+        self._events: List[tuple] = []
+        self._flushing: Tuple[Dict[Tuple[str, str], Tuple[int, float]], ...] = ({}, {})  # (new, bests) mid-commit
+        self._flushed_at = time.monotonic()
+        # Shared by the event loop and the HTTP threads that diff streamed worker lists
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # flush() commits on its own connection, one flush at a time
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._commit_lock = threading.Lock()
+        # Set by main(): every write transaction is fenced on the writer lease
+        self.lease: Optional["WriterLease"] = None
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with self.conn:
+                self.conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS workers (
+                        name TEXT PRIMARY KEY,
+                        bestever INTEGER NOT NULL,
+                        first_seen REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS ath_events (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        ts REAL NOT NULL,
+                        worker TEXT NOT NULL,
+                        display TEXT NOT NULL,
+                        previous INTEGER,
+                        bestever INTEGER NOT NULL,
+                        network_difficulty INTEGER
+                    );
+                    CREATE INDEX IF NOT EXISTS ath_events_worker_ts ON ath_events (worker, ts);
+                    PRAGMA user_version = 1;
+                """)
+        if version < 2:
+            # Multi-pool: workers are keyed by (pool, name); existing rows belong to the default pool
+            with self.conn:
+                self.conn.executescript(f"""
+                    CREATE TABLE workers_v2 (
+                        pool TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        bestever INTEGER NOT NULL,
+                        first_seen REAL NOT NULL,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (pool, name)
+                    );
+                    INSERT INTO workers_v2 SELECT '{DEFAULT_POOL}', name, bestever, first_seen, updated_at FROM workers;
+                    DROP TABLE workers;
+                    ALTER TABLE workers_v2 RENAME TO workers;
+                    ALTER TABLE ath_events ADD COLUMN pool TEXT NOT NULL DEFAULT '{DEFAULT_POOL}';
+                    PRAGMA user_version = 2;
+                """)
+
+    def import_state_file(self, path: str) -> int:
+        """One-time import of bests from a legacy state.json into an empty store"""
+        if self.conn.execute("SELECT 1 FROM workers LIMIT 1").fetchone():
+            return 0
+        last_bestever = load_state(path).get("last_bestever", {})
+        if not isinstance(last_bestever, dict):
+            return 0
+        now = time.time()
+        rows = []
+        for name, best in last_bestever.items():
+            try:
+                rows.append((DEFAULT_POOL, name, int(best), now, now))
+            except (TypeError, ValueError):
+                continue
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO workers VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def load_bests(self, pool: str) -> Dict[str, Tuple[int, float, bool]]:
+        """{name: (bestever, first_seen, raised)} for every worker of a pool.
+
+        raised is True when the best was set after the worker was first seen,
+        i.e. found by hashing the watcher has observed.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT name, bestever, first_seen, updated_at FROM workers WHERE pool = ?", (pool,))
+            found = {name: (best, first_seen, updated_at > first_seen) for name, best, first_seen, updated_at in rows}
+            for new, bests in (self._flushing, (self._new, self._bests)):
+                for (p, name), (best, seen) in new.items():
+                    if p == pool:
+                        found.setdefault(name, (best, seen, False))
+                for (p, name), (best, ts) in bests.items():
+                    if p == pool:
+                        old = found.get(name)
+                        found[name] = (max(best, old[0]), old[1], True) if old else (best, ts, True)
+        return found
+
+    def load_best(self, pool: str, name: str) -> Optional[Tuple[int, float, bool]]:
+        with self.lock:
+            row = self.conn.execute("SELECT bestever, first_seen, updated_at FROM workers WHERE pool = ? AND name = ?",
+                                    (pool, name)).fetchone()
+            new = self._new.get((pool, name)) or self._flushing[0].get((pool, name))
+            bests = [b for b in (self._bests.get((pool, name)), self._flushing[1].get((pool, name))) if b]
+        if row is None and new is None:
+            return None
+        first_seen = row[1] if row else new[1]
+        raised = bool(bests) or (row is not None and row[2] > row[1])
+        values = [row and row[0], new and new[0]] + [best for best, _ in bests]
+        return max(value for value in values if value is not None), first_seen, raised
+
+    def record_poll(self, pool: str, new_workers: List[Tuple[str, int]], improvements: List[Tuple[str, Optional[int], Dict[str, Any]]]) -> bool:
+        """Buffer one poll's changes for the next flush(); True if the caller should flush now.
+
+        new_workers: (name, bestever) seen for the first time.
+        improvements: (name, previous best, ATH event) for every new record.
+        """
+        if not new_workers and not improvements:
+            return False
+        now = time.time()
+        with self.lock:
+            for name, best in new_workers:
+                self._new[(pool, name)] = (best, now)
+            for name, previous, event in improvements:
+                self._bests[(pool, name)] = (event["bestever"], now)
+                self._events.append((now, pool, name, event["display"], previous, event["bestever"],
+                                     event.get("network_difficulty")))
+            buffered = len(self._new) + len(self._bests)
+        return self.flush_interval <= 0 or buffered >= self.MAX_BUFFERED
+
+    def flush(self) -> int:
+        """Commit everything buffered in one fenced transaction; returns the number of rows written.
+
+        Blocks on the disk, so call it from a worker thread, never the event loop.
+        """
+        with self._commit_lock:
+            with self.lock:
+                self._flushed_at = time.monotonic()
+                if not self._new and not self._bests and not self._events:
+                    return 0
+                new, bests, events = self._new, self._bests, self._events
+                self._new, self._bests, self._events = {}, {}, []
+                self._flushing = (new, bests)
+            try:
+                self._commit(new, bests, events)
+            except BaseException:
+                # Put the batch back to be retried with the next flush; anything buffered since is newer
+                with self.lock:
+                    self._new = {**self._new, **new}
+                    self._bests = {**bests, **self._bests}
+                    self._events = events + self._events
+                    self._flushing = ({}, {})
+                raise
+            with self.lock:
+                self._flushing = ({}, {})
+        return len(new) + len(bests) + len(events)
+
+    def _commit(self, new: Dict[Tuple[str, str], Tuple[int, float]], bests: Dict[Tuple[str, str], Tuple[int, float]],
+                events: List[tuple]) -> None:
+        conn = self._writer
+        with conn:
+            if self.lease is not None:
+                self.lease.fence(conn)
+            conn.executemany(
+                "INSERT INTO workers (pool, name, bestever, first_seen, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(pool, name) DO UPDATE SET bestever = excluded.bestever, updated_at = excluded.updated_at",
+                [(pool, name, best, seen, seen) for (pool, name), (best, seen) in new.items()],
+            )
+            # An upsert, so a worker whose first-seen row never made it in still keeps its ATH
+            conn.executemany(
+                "INSERT INTO workers (pool, name, bestever, first_seen, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(pool, name) DO UPDATE SET bestever = excluded.bestever, updated_at = excluded.updated_at",
+                [(pool, name, best, ts, ts) for (pool, name), (best, ts) in bests.items()],
+            )
+            conn.executemany(
+                "INSERT INTO ath_events (ts, pool, worker, display, previous, bestever, network_difficulty) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                events,
+            )
+
+    def maybe_flush(self) -> int:
+        if time.monotonic() - self._flushed_at < self.flush_interval:
+            return 0
+        return self.flush()
+
+    @staticmethod
+    def backups(path: str) -> List[str]:
+        """Backup generations of path, newest first"""
+        return [f"{path}.bak.{n}" for n in range(1, DB_BACKUP_GENERATIONS + 1)]
+
+    def backup_due(self) -> bool:
+        if DB_BACKUP_HOURS <= 0 or DB_BACKUP_GENERATIONS <= 0:
+            return False
+        try:
+            newest = os.path.getmtime(self.backups(self.path)[0])
+        except OSError:
+            return True
+        return time.time() - newest >= DB_BACKUP_HOURS * 3600
+
+    def backup(self) -> str:
+        """Write a verified, checksummed copy of the database and rotate the older generations"""
+        self.flush()
+        tmp = self.path + ".bak.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        # A separate connection reads a consistent snapshot without holding up the pollers
+        source = sqlite3.connect(self.path)
+        target = sqlite3.connect(tmp)
+        try:
+            source.backup(target)
+            if not self._intact(target):
+                raise sqlite3.DatabaseError("backup failed its integrity check")
+        finally:
+            target.close()
+            source.close()
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        checksum = file_sha256(tmp)
+        generations = self.backups(self.path)
+        for older, newer in zip(reversed(generations), list(reversed(generations))[1:]):
+            for suffix in ("", ".sha256"):
+                if os.path.exists(newer + suffix):
+                    os.replace(newer + suffix, older + suffix)
+        with open(generations[0] + ".sha256.tmp", "w", encoding="utf-8") as f:
+            f.write(checksum + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, generations[0])
+        os.replace(generations[0] + ".sha256.tmp", generations[0] + ".sha256")
+        fsync_dir(self.path)
+        return generations[0]
+
+    @staticmethod
+    def _intact(conn: sqlite3.Connection) -> bool:
+        try:
+            return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+        except sqlite3.DatabaseError:
+            return False
 
+    @classmethod
+    def _verified(cls, path: str) -> bool:
+        """A backup is usable if it matches its checksum and passes SQLite's own check"""
+        try:
+            with open(path + ".sha256", "r", encoding="utf-8") as f:
+                expected = f.read().strip()
+            if file_sha256(path) != expected:
+                return False
+        except OSError:
+            return False
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return cls._intact(conn)
+        finally:
+            conn.close()
+
+    @classmethod
+    def recover(cls, path: str, lease: Optional["WriterLease"] = None) -> Optional[str]:
+        """Check the database before the store opens it; a corrupt one is moved aside and
+        replaced with the newest backup that verifies. Returns what was done, if anything.
+
+        Run while holding the lease, so a starting standby never touches the active
+        writer's files; without one (the database is too damaged to hold the lease
+        table) an exclusive lock on path.lock keeps replicas from recovering at once.
+        """
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return cls._recover(path, lease)
+
+    @classmethod
+    def _recover(cls, path: str, lease: Optional["WriterLease"]) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        try:
+            conn = sqlite3.connect(path)
+        except sqlite3.DatabaseError:
+            conn = None
+        if conn is not None:
+            try:
+                if cls._intact(conn):
+                    return None
+            finally:
+                conn.close()
+        if lease is not None:
+            lease.renew()  # exits if the check outlasted the lease and a standby took over
+        aside = f"{path}.corrupt-{int(time.time())}"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.replace(path + suffix, aside + suffix)
+        for backup in cls.backups(path):
+            if os.path.exists(backup) and cls._verified(backup):
+                shutil.copyfile(backup, path + ".tmp")
+                with open(path + ".tmp", "rb+") as f:
+                    os.fsync(f.fileno())
+                os.replace(path + ".tmp", path)
+                fsync_dir(path)
+                return f"moved the corrupt database to {aside} and restored {backup}"
+        return f"moved the corrupt database to {aside}; no intact backup, starting empty"
+
+
+# A standby replica takes over this long after the active watcher stops renewing
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "15"))
+# Exit status when the lease is lost; the container restarts as a standby
+LEASE_LOST_EXIT = 75
+
+
+class WriterLease:
+    """Single-writer lease kept in the shared database, so replicas can run as hot standbys.
+
+    One row holds the current holder, a fencing epoch and an expiry. The holder
+    renews it every ttl/3; a standby takes it over with epoch + 1 once it
+    expires. Database commits are fenced on (holder, epoch) and file writes
+    check the local deadline, so a replica that stalls past its lease cannot
+    write after a standby has taken over. Losing the lease exits the process.
+    """
+
+    def __init__(self, path: str, ttl: float = LEASE_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.conn, self.inode = self._connect(create=True)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(3).hex()}"
+        self.epoch = 0
+        self.deadline = 0.0  # time.monotonic() after which this process must not write
+        self.released = False
+        self.lock = threading.Lock()
+
+    def _connect(self, create: bool) -> Tuple[sqlite3.Connection, int]:
+        # Standbys reconnect with mode=rw, so one never creates a database while the holder restores it
+        uri = f"file:{self.path}" if create else f"file:{self.path}?mode=rw"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.ttl, isolation_level=None, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lease (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    holder TEXT NOT NULL,
+                    epoch INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn, os.stat(self.path).st_ino
+
+    def reopen(self, create: bool = True) -> None:
+        """Connect to the file now at path, after recovery replaced the database"""
+        conn, inode = self._connect(create)
+        with self.lock:
+            self.conn.close()
+            self.conn, self.inode = conn, inode
+
+    def _follow(self) -> None:
+        """A standby's connection still points at a database that recovery moved aside; move to the new one"""
+        try:
+            if os.stat(self.path).st_ino != self.inode:
+                self.reopen(create=False)
+        except (OSError, sqlite3.Error):
+            pass  # mid-restore; try again on the next round
+
+    def current(self) -> Optional[Tuple[str, int, float]]:
+        with self.lock:
+            return self.conn.execute("SELECT holder, epoch, expires_at FROM lease WHERE id = 1").fetchone()
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or expired"""
+        started = time.monotonic()
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT holder, epoch, expires_at FROM lease WHERE id = 1").fetchone()
+                if row is not None and row[2] > now:
+                    self.conn.execute("ROLLBACK")
+                    return False
+                epoch = (row[1] if row else 0) + 1
+                self.conn.execute("INSERT OR REPLACE INTO lease VALUES (1, ?, ?, ?)", (self.holder, epoch, now + self.ttl))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.epoch = epoch
+        self.deadline = started + self.ttl
+        return True
+
+    def wait(self) -> None:
+        """Block as a standby until this replica holds the lease"""
+        announced = False
+        while not self.acquire():
+            row = self.current()
+            if not announced and row:
+                print(f"[watcher] Standby: {row[0]} holds the writer lease (epoch {row[1]}); "
+                      f"taking over if it stops renewing for {self.ttl:g}s")
+                announced = True
+            expires_in = (row[2] - time.time()) if row else 0
+            time.sleep(min(max(expires_in, 0.05), self.ttl / 3))
+            self._follow()
+        print(f"[watcher] Acquired writer lease (epoch {self.epoch})")
+
+    def renew(self) -> None:
+        """Extend the lease; sqlite3.Error (e.g. a long commit holding the write lock) leaves it to be retried"""
+        started = time.monotonic()
+        with self.lock:
+            if self.released:
+                return
+            # Give up on a busy database well within the lease, leaving time to retry
+            self.conn.execute(f"PRAGMA busy_timeout = {int(self.ttl * 1000 / 6)}")
+            renewed = self.conn.execute(
+                "UPDATE lease SET expires_at = ? WHERE id = 1 AND holder = ? AND epoch = ?",
+                (time.time() + self.ttl, self.holder, self.epoch),
+            ).rowcount
+        if renewed != 1:
+            self.lost("another replica took over")
+        self.deadline = started + self.ttl
+
+    def held(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    def check(self) -> None:
+        """Call before any write outside the database"""
+        if not self.held():
+            self.lost("it expired before it could be renewed")
+
+    def fence(self, conn: sqlite3.Connection) -> None:
+        """First statement of a write transaction on conn: takes the write lock and checks the epoch"""
+        fenced = conn.execute(
+            "UPDATE lease SET epoch = epoch WHERE id = 1 AND holder = ? AND epoch = ?", (self.holder, self.epoch)
+        ).rowcount
+        if fenced != 1:
+            self.lost("another replica took over")
+
+    def release(self) -> None:
+        """Expire the lease on a clean shutdown so a standby takes over without waiting out the ttl"""
+        with self.lock:
+            self.conn.execute("UPDATE lease SET expires_at = 0 WHERE id = 1 AND holder = ? AND epoch = ?",
+                              (self.holder, self.epoch))
+            self.released = True
+        self.deadline = 0.0
+
+    def lost(self, reason: str) -> None:
+        print(f"[watcher] Lost the writer lease (epoch {self.epoch}): {reason}; exiting to restart as a standby")
+        sys.stdout.flush()
+        os._exit(LEASE_LOST_EXIT)
+
+
+# (label, bucket width in seconds, capacity); width 0 keeps every raw sample
+SERIES_TIERS = (("raw", 0, 120), ("1m", 60, 180), ("1h", 3600, 168), ("1d", 86400, 365))
+
+_HASHRATE_UNITS = {"": 1, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15, "E": 1e18}
+
+
+def parse_hashrate(value: Any) -> float:
+    """Hashrate as H/s from a number or a ckpool-style string like '1.2T'; NaN if unknown"""
+    if value is None:
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().upper().rstrip("H/S").strip()
+    unit = text[-1:] if text[-1:] in _HASHRATE_UNITS else ""
+    try:
+        return float(text[:len(text) - len(unit)]) * _HASHRATE_UNITS[unit]
+    except ValueError:
+        return math.nan
 
-def get_json(url: str) -> Dict[str, Any]:
-    cookies = {"UMBREL_PROXY_TOKEN": PROXY_TOKEN} if PROXY_TOKEN else None
 
-    r = requests.get(
-        url,
-        cookies=cookies,
-        headers={"Accept": "application/json"},
-        timeout=15,
-    )
-    r.raise_for_status()
-    data = r.json()
-    return data if isinstance(data, dict) else {"_raw": data}
+class SeriesStore:
+    """Per-worker ring buffers of (bestever, hashrate) samples in a memory-mapped file.
 
+    Every worker owns a fixed-size slot holding one ring per tier: raw samples
+    plus 1-minute, 1-hour and 1-day rollups (max bestever, summed hashrate and
+    sample count per bucket), so memory is bounded by the tier capacities and
+    restarts simply re-map the file. The backend maps the same file read-only.
+
+    File layout: a HEADER_SIZE-byte header (magic, version, slot size, slot
+    count, tier count, then width/capacity per tier), followed by slots. A slot
+    is a NAME_BYTES label, a (head, count) pair per tier and then the tiers'
+    rings of FIELDS doubles per entry. The label is the utf-8 name, or for a
+    name longer than NAME_BYTES, LONG_NAME followed by the hex sha256 of it;
+    0xFF never occurs in utf-8, so the two cannot collide.
+    """
+
+    MAGIC = b"AXSERIES"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIII")
+    HEADER_SIZE = 128
+    TIER = struct.Struct("<II")
+    NAME_BYTES = 112
+    LONG_NAME = b"\xffsha256:"
+    FIELDS = 4  # bucket start, best, hashrate sum, hashrate samples
+    GROW_SLOTS = 64
+
+    def __init__(self, path: str, tiers=SERIES_TIERS):
+        self.path = path
+        self.tiers = tiers
+        self.tier_offsets: List[int] = []
+        offset = (self.NAME_BYTES + self.TIER.size * len(tiers)) // 8
+        for _, _, capacity in tiers:
+            self.tier_offsets.append(offset)
+            offset += capacity * self.FIELDS
+        self.slot_size = offset * 8
+        self.slots: Dict[bytes, int] = {}  # label -> slot
+        self._names: Dict[Tuple[str, Any], bytes] = {}
+        # Pools record from their own HTTP threads
+        self.lock = threading.Lock()
+        self._open()
+
+    def _layout(self) -> bytes:
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.slot_size, 0, len(self.tiers))
+        for _, width, capacity in self.tiers:
+            header += self.TIER.pack(width, capacity)
+        return header
+
+    def _open(self) -> None:
+        layout = self._layout()
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        current = os.pread(self.fd, len(layout), 0)
+        expected = layout[:8 + 8] + layout[20:]  # everything except the slot count
+        if len(current) != len(layout) or current[:16] + current[20:] != expected:
+            # Missing, corrupt or written with another tier layout: start over
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, self.HEADER_SIZE)
+            os.pwrite(self.fd, layout, 0)
+        self._map()
+        self.free: List[int] = []
+        self.next_slot = 0
+        for slot in range(self.slot_count):
+            base = self._base(slot)
+            label = bytes(self.mm[base:base + self.NAME_BYTES]).rstrip(b"\0")
+            if self._cut(label):
+                # A name an older version cut mid-character; nothing will look it up again
+                self.mm[base:base + self.slot_size] = bytes(self.slot_size)
+            elif label:
+                self.slots[label] = slot
+                self.next_slot = slot + 1
+        used = set(self.slots.values())
+        self.free = [slot for slot in range(self.next_slot) if slot not in used]
+
+    def _map(self) -> None:
+        self.mm = mmap.mmap(self.fd, os.fstat(self.fd).st_size)
+        self.slot_count = self.HEADER.unpack_from(self.mm, 0)[3]
+        self.values = memoryview(self.mm).cast("d")
+
+    def _base(self, slot: int) -> int:
+        return self.HEADER_SIZE + slot * self.slot_size
+
+    @classmethod
+    def _cut(cls, label: bytes) -> bool:
+        if label.startswith(cls.LONG_NAME):
+            return False
+        try:
+            label.decode("utf-8")
+        except UnicodeDecodeError:
+            return True
+        return False
+
+    @classmethod
+    def label(cls, name: str) -> bytes:
+        """The slot label of a worker name; never a truncation, so no two names share a slot"""
+        encoded = name.encode("utf-8")
+        if len(encoded) <= cls.NAME_BYTES:
+            return encoded
+        return cls.LONG_NAME + hashlib.sha256(encoded).hexdigest().encode("ascii")
+
+    def _allocate(self, label: bytes) -> int:
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = self.next_slot
+            self.next_slot += 1
+        if slot >= self.slot_count:
+            count = self.slot_count + self.GROW_SLOTS
+            self.values.release()
+            self.mm.close()
+            os.ftruncate(self.fd, self._base(count))
+            self._map()
+            struct.pack_into("<I", self.mm, 16, count)
+            self.slot_count = count
+        self.mm[self._base(slot):self._base(slot) + len(label)] = label
+        self.slots[label] = slot
+        return slot
+
+    def release(self, names: List[str]) -> None:
+        """Clear the slots of workers that are gone so new workers can reuse them"""
+        with self.lock:
+            for name in names:
+                slot = self.slots.pop(self.label(name), None)
+                if slot is not None:
+                    base = self._base(slot)
+                    self.mm[base:base + self.slot_size] = bytes(self.slot_size)
+                    self.free.append(slot)
+            self._names.clear()
+
+    def sync(self) -> None:
+        """Write dirty pages back now instead of whenever the kernel gets to them"""
+        with self.lock:
+            self.mm.flush()
+
+    def record(self, label: bytes, ts: float, best: float, hashrate: float) -> None:
+        slot = self.slots.get(label)
+        if slot is None:
+            slot = self._allocate(label)
+        base = self._base(slot)
+        values = self.values
+        has_rate = hashrate == hashrate  # NaN check
+        rate = hashrate if has_rate else 0.0
+        samples = 1.0 if has_rate else 0.0
+
+        for t, (_, width, capacity) in enumerate(self.tiers):
+            tier_at = base + self.NAME_BYTES + t * self.TIER.size
+            head, count = self.TIER.unpack_from(self.mm, tier_at)
+            ring = base // 8 + self.tier_offsets[t]
+            bucket = ts - ts % width if width else ts
+
+            if width and count:
+                last = ring + ((head - 1) % capacity) * self.FIELDS
+                if values[last] == bucket:
+                    values[last + 1] = max(values[last + 1], best)
+                    values[last + 2] += rate
+                    values[last + 3] += samples
+                    continue
+
+            entry = ring + head * self.FIELDS
+            values[entry] = bucket
+            values[entry + 1] = best
+            values[entry + 2] = rate
+            values[entry + 3] = samples
+            self.TIER.pack_into(self.mm, tier_at, (head + 1) % capacity, min(count + 1, capacity))
+
+    def record_poll(self, details: List[Any], pool: str = DEFAULT_POOL, ts: Optional[float] = None) -> None:
+        """Append one sample per worker from a /api/pool/workers payload"""
+        ts = time.time() if ts is None else ts
+        for w in details:
+            self.record_worker(w, pool, ts)
+
+    def record_worker(self, w: Any, pool: str, ts: float) -> None:
+        """Append one sample from a single /api/pool/workers entry"""
+        if not isinstance(w, dict):
+            return
+        key = (pool, w.get("workername"))
+        label = self._names.get(key)
+        if label is None:
+            stripped = str(key[1] or "").strip()
+            label = self.label(pool_worker_key(pool, stripped)) if stripped else b""
+            self._names[key] = label
+        bestever = w.get("bestever")
+        if not label or bestever is None:
+            return
+        try:
+            best = float(bestever)
+        except (TypeError, ValueError):
+            return
+        rate = w.get("hashrate1m", w.get("hashrate"))
+        with self.lock:
+            self.record(label, ts, best, parse_hashrate(rate))
+
+
+class Histogram:
+    """Prometheus-style histogram, optionally split by one label"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], label: Optional[str] = None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series: Dict[Optional[str], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: Optional[str] = None) -> None:
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # one count per bucket, then +Inf count and sum
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def time(self, label_value: Optional[str] = None) -> "_Timer":
+        return _Timer(self, label_value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items(), key=lambda kv: kv[0] or ""):
+                labels = f'{self.label}="{label_value}",' if self.label else ""
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {count:d}')
+                lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {series[-2]:d}')
+                suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{suffix} {series[-2]:d}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_value: Optional[str]):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.label_value)
+        return False
+
+
+class Counter:
+    """Monotonic counter, optionally split by one label"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[Optional[str], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, label_value: Optional[str] = None) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def set(self, value: float, label_value: Optional[str] = None) -> None:
+        with self._lock:
+            self._values[label_value] = value
+
+    def value(self, label_value: Optional[str] = None) -> Optional[float]:
+        with self._lock:
+            return self._values.get(label_value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items(), key=lambda kv: kv[0] or ""):
+                labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+                # repr keeps every digit: :g would round timestamps and large counts to 6 significant figures
+                lines.append(f"{self.name}{labels} {float(value)!r}")
+        return lines
+
+
+class Gauge(Counter):
+    """Point-in-time value; use set()"""
+
+    kind = "gauge"
+
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """Everything the watcher exports on /metrics"""
+
+    fetch_seconds = Histogram("axebch_fetch_seconds", "Pool API request latency.", _LATENCY_BUCKETS, "endpoint")
+    parse_seconds = Histogram("axebch_parse_seconds", "JSON decoding time of pool API responses.", _LATENCY_BUCKETS, "endpoint")
+    diff_seconds = Histogram("axebch_diff_seconds", "Time spent comparing workers against stored bests.", _LATENCY_BUCKETS)
+    poll_seconds = Histogram("axebch_poll_seconds", "Total duration of a poll iteration.", _LATENCY_BUCKETS)
+    webhook_seconds = Histogram("axebch_webhook_seconds", "Discord webhook request latency.", _LATENCY_BUCKETS)
+    sink_seconds = Histogram("axebch_sink_seconds", "Notification delivery latency per sink, including retries after 429s.", _LATENCY_BUCKETS, "sink")
+    polls = Counter("axebch_polls_total", "Completed poll iterations.", "result")
+    errors = Counter("axebch_errors_total", "Errors by stage.", "stage")
+    aths = Counter("axebch_ath_total", "New worker all-time highs detected.")
+    notifications = Counter("axebch_notifications_total", "Notifications delivered, per sink.", "sink")
+    outbox_pending = Gauge("axebch_outbox_pending", "Notifications waiting for delivery.")
+    workers = Gauge("axebch_workers", "Workers in the last pool API response.", "pool")
+    last_poll = Gauge("axebch_last_poll_timestamp_seconds", "Unix time of the last poll iteration.")
+    next_poll = Gauge("axebch_next_poll_delay_seconds", "Delay chosen before the next poll.", "pool")
+
+    @classmethod
+    def render(cls) -> str:
+        lines: List[str] = []
+        for metric in vars(cls).values():
+            if isinstance(metric, (Histogram, Counter)):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+DIAGNOSTICS_DIR = os.getenv("DIAGNOSTICS_DIR", "/data/diagnostics")
+DIAGNOSTICS_KEEP = int(os.getenv("DIAGNOSTICS_KEEP", "20"))
+PROFILE_POLLS = int(os.getenv("PROFILE_POLLS", "10"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+MEMORY_SNAPSHOT_SECONDS = float(os.getenv("MEMORY_SNAPSHOT_SECONDS", "600"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+
+
+def get_slow_poll_seconds() -> float:
+    """Polls slower than this dump a profile automatically; 0 disables the trigger"""
+    settings = load_settings()
+    try:
+        return float(settings.get("slow_poll_seconds", os.getenv("SLOW_POLL_SECONDS", "0")) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class StackSampler(threading.Thread):
+    """Statistical wall-clock profiler: samples every thread's Python stack at a fixed interval.
+
+    Samples are tallied per second of time.monotonic(), so a slow poll's
+    stacks can be pulled out after the fact; trim() drops old seconds.
+    Threads parked in an idle wait are skipped.
+    """
+
+    IDLE_LEAVES = {"wait", "select", "_worker"}
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="sampler", daemon=True)
+        self.interval = interval
+        self.buckets: "OrderedDict[int, Tally]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_name in self.IDLE_LEAVES:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                stacks.append((names.get(ident, str(ident)), tuple(codes)))
+            second = int(time.monotonic())
+            with self.lock:
+                bucket = self.buckets.get(second)
+                if bucket is None:
+                    bucket = self.buckets[second] = Tally()
+                bucket.update(stacks)
+
+    def trim(self, before: float) -> None:
+        with self.lock:
+            while self.buckets and next(iter(self.buckets)) < int(before):
+                self.buckets.popitem(last=False)
+
+    def collapsed(self, start: float, end: float) -> List[str]:
+        """Samples between two time.monotonic() values as collapsed stacks (flamegraph.pl, speedscope)"""
+        total: Tally = Tally()
+        with self.lock:
+            for second, bucket in self.buckets.items():
+                if int(start) <= second <= int(end):
+                    total.update(bucket)
+        lines = []
+        for (thread, codes), count in total.most_common():
+            frames = [f"{os.path.basename(code.co_filename)}:{code.co_name}" for code in reversed(codes)]
+            lines.append(";".join([thread] + frames) + f" {count}")
+        return lines
+
+
+class Diagnostics:
+    """Opt-in CPU and memory diagnostics for a watcher that runs for weeks, toggled at runtime.
+
+    - SIGUSR1 or {"cmd": "profile"}: sample the stacks of every thread during
+      the next N polls and dump them as collapsed stacks.
+    - slow_poll_seconds (setting) keeps a sampler running and dumps the
+      stacks of any poll slower than that, at most once per SLOW_POLL_COOLDOWN.
+    - SIGUSR2 or {"cmd": "memory"}: start/stop tracemalloc; while tracing a
+      snapshot is taken every MEMORY_SNAPSHOT_SECONDS and diffed against the
+      previous and the first one, showing which allocations keep growing.
+    Everything is written to DIAGNOSTICS_DIR, keeping the newest DIAGNOSTICS_KEEP files.
+    """
+
+    SLOW_POLL_COOLDOWN = 300
+    MEMORY_TOP = 25
+
+    def __init__(self, directory: str = DIAGNOSTICS_DIR):
+        self.directory = directory
+        self.sampler: Optional[StackSampler] = None
+        self.profile_polls = 0  # polls left to profile
+        self.profile_armed = 0
+        self.profile_started = 0.0
+        self.slow_dumped_at = -math.inf
+        self.memory_first: Optional[tracemalloc.Snapshot] = None
+        self.memory_last: Optional[tracemalloc.Snapshot] = None
+        self.memory_last_at = 0.0
+
+    def state(self) -> Dict[str, Any]:
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        return {
+            "profile_polls_left": self.profile_polls or self.profile_armed,
+            "slow_poll_seconds": get_slow_poll_seconds(),
+            "memory_tracing": traced is not None,
+            "traced_bytes": traced[0] if traced else None,
+            "traced_peak_bytes": traced[1] if traced else None,
+            "directory": self.directory,
+        }
+
+    def _write(self, name: str, lines: List[str]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime("%Y%m%d-%H%M%S-") + name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+        files = sorted(os.listdir(self.directory))
+        for old in files[:max(len(files) - DIAGNOSTICS_KEEP, 0)]:
+            os.remove(os.path.join(self.directory, old))
+        return path
+
+    def _sampling(self, wanted: bool) -> None:
+        if wanted and self.sampler is None:
+            self.sampler = StackSampler()
+            self.sampler.start()
+        elif not wanted and self.sampler is not None:
+            self.sampler.stopped.set()
+            self.sampler = None
+
+    def request_profile(self, polls: int = PROFILE_POLLS) -> int:
+        """Profile the next `polls` polls (across all pools)"""
+        self.profile_armed = max(int(polls), 1)
+        print(f"[watcher] Profiling the next {self.profile_armed} poll(s)")
+        return self.profile_armed
+
+    def poll_started(self) -> None:
+        if self.profile_armed and not self.profile_polls:
+            self.profile_polls, self.profile_armed = self.profile_armed, 0
+            self.profile_started = time.monotonic()
+            self._sampling(True)
+
+    def poll_finished(self, pool: str, started: float, ended: float) -> None:
+        """Called with time.monotonic() bounds after every poll"""
+        threshold = get_slow_poll_seconds()
+        if self.sampler is not None:
+            if threshold > 0 and ended - started > threshold and ended - self.slow_dumped_at >= self.SLOW_POLL_COOLDOWN:
+                self.slow_dumped_at = ended
+                path = self._write(f"slow-poll-{pool}.folded", self.sampler.collapsed(started, ended))
+                print(f"[watcher] Poll of {pool} took {ended - started:.1f}s (> {threshold:g}s); stacks saved to {path}")
+            if self.profile_polls:
+                self.profile_polls -= 1
+                if not self.profile_polls:
+                    path = self._write("profile.folded", self.sampler.collapsed(self.profile_started, ended))
+                    print(f"[watcher] Profile saved to {path}")
+        keep_from = self.profile_started if self.profile_polls else ended - max(2 * threshold, 60)
+        if self.sampler is not None:
+            self.sampler.trim(keep_from)
+        self._sampling(threshold > 0 or bool(self.profile_polls) or bool(self.profile_armed))
+        if self.memory_first is not None and time.monotonic() - self.memory_last_at >= MEMORY_SNAPSHOT_SECONDS:
+            self.memory_snapshot()
+
+    def memory_start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        self.memory_first = self.memory_last = self._snapshot()
+        self.memory_last_at = time.monotonic()
+        print(f"[watcher] Tracing allocations; snapshots every {MEMORY_SNAPSHOT_SECONDS:g}s to {self.directory}")
+
+    def memory_snapshot(self) -> Optional[str]:
+        """Diff a new snapshot against the previous and the first; returns the report's path"""
+        if self.memory_first is None:
+            return None
+        snapshot = self._snapshot()
+        elapsed = time.monotonic() - self.memory_last_at
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB", ""]
+        for title, base in ((f"Growth over the last {elapsed:.0f}s", self.memory_last),
+                            ("Growth since tracing started", self.memory_first)):
+            lines.append(title)
+            stats = snapshot.compare_to(base, "traceback")
+            for stat in stats[:self.MEMORY_TOP]:
+                lines.append(f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks), now {stat.size / 1024:.1f} KiB")
+                # Innermost frames first; no source lines, linecache would skew the next diff
+                lines.extend(f"    {frame.filename}:{frame.lineno}" for frame in list(stat.traceback)[-4:][::-1])
+            lines.append("")
+        self.memory_last = snapshot
+        self.memory_last_at = time.monotonic()
+        path = self._write("memory.txt", lines)
+        print(f"[watcher] Memory snapshot: {current / 2 ** 20:.1f} MiB traced; diff saved to {path}")
+        return path
+
+    def memory_stop(self) -> Optional[str]:
+        path = self.memory_snapshot()
+        self.memory_first = self.memory_last = None
+        tracemalloc.stop()
+        print("[watcher] Stopped tracing allocations")
+        return path
+
+    def toggle_memory(self) -> None:
+        if self.memory_first is None:
+            self.memory_start()
+        else:
+            self.memory_stop()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+
+DIAGNOSTICS = Diagnostics()
+
+
+HEARTBEAT_FILE = os.getenv("HEARTBEAT_FILE", "/data/heartbeat.json")
+EVENTS_SOCKET = os.getenv("EVENTS_SOCKET", "/data/events.sock")
+CONTROL_SOCKET = os.getenv("CONTROL_SOCKET", "/data/control.sock")
+
+
+class EventPublisher:
+    """Fire-and-forget JSON datagrams to the backend's live event socket.
+
+    The backend fans them out to browsers over SSE. Delivery is best effort:
+    if the backend is not listening the event is dropped, never blocking a poll.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, event_type: str, **data: Any) -> None:
+        data["type"] = event_type
+        data.setdefault("ts", time.time())
+        try:
+            self.sock.sendto(json.dumps(data, separators=(",", ":")).encode("utf-8"), self.path)
+        except OSError:
+            pass
+
+
+EVENTS = EventPublisher(EVENTS_SOCKET)
+
+
+def write_heartbeat(status: str, next_poll_seconds: float, error: Optional[str] = None,
+                    pools: Optional[Dict[str, Any]] = None) -> None:
+    """Publish liveness and a metrics snapshot for the backend (/api/status, /metrics)"""
+    now = time.time()
+    Metrics.last_poll.set(now)
+    heartbeat = {
+        "ts": now,
+        "pid": os.getpid(),
+        "status": status,
+        "next_poll_seconds": next_poll_seconds,
+        "error": error,
+        "pools": pools or {},
+        "metrics": Metrics.render(),
+    }
+    tmp = HEARTBEAT_FILE + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(heartbeat, f)
+        os.replace(tmp, HEARTBEAT_FILE)
+    except OSError as e:
+        print(f"[watcher] could not write heartbeat: {e}")
+    workers = sum(v for v in (Metrics.workers.value(name) for name in (pools or {})) if v)
+    EVENTS.publish("heartbeat", status=status, next_poll_seconds=next_poll_seconds, error=error,
+                   workers=workers, pending=Metrics.outbox_pending.value())
+
+
+class HeartbeatBoard:
+    """Collects per-pool poll results into the single process heartbeat.
+
+    The overall status is the worst across pools. With many pools finishing
+    polls back to back, the file is rewritten at most every MIN_INTERVAL
+    seconds unless the overall status changes.
+    """
+
+    MIN_INTERVAL = 1.0
+    SEVERITY = {"running": 0, "waiting_for_webhook": 1, "error": 2}
+
+    def __init__(self):
+        self.pools: Dict[str, Dict[str, Any]] = {}
+        self._written_at = 0.0
+        self._written_status: Optional[str] = None
+
+    def report(self, pool: str, status: str, next_poll_seconds: float, error: Optional[str] = None) -> None:
+        Metrics.next_poll.set(next_poll_seconds, pool)
+        self.pools[pool] = {"status": status, "next_poll_seconds": next_poll_seconds, "error": error, "ts": time.time()}
+        self.flush()
+
+    def forget(self, pool: str) -> None:
+        self.pools.pop(pool, None)
+
+    def flush(self, force: bool = False) -> None:
+        if not self.pools:
+            return
+        worst = max(self.pools.values(), key=lambda p: self.SEVERITY.get(p["status"], 0))
+        status = worst["status"]
+        now = time.monotonic()
+        if not force and status == self._written_status and now - self._written_at < self.MIN_INTERVAL:
+            return
+        next_poll = min(p["next_poll_seconds"] for p in self.pools.values())
+        errors = [f"{name}: {p['error']}" if len(self.pools) > 1 else p["error"]
+                  for name, p in self.pools.items() if p["error"]]
+        write_heartbeat(status, next_poll, "; ".join(errors) or None, self.pools)
+        self._written_at = now
+        self._written_status = status
+
+    def stop(self) -> None:
+        """Final heartbeat on a clean shutdown, so the backend reports stopped rather than stalled"""
+        for pool in self.pools.values():
+            pool.update(status="stopped", next_poll_seconds=0, error=None)
+        write_heartbeat("stopped", 0, None, self.pools)
+        self._written_status = "stopped"
+
+
+class StdlibHTTPError(OSError):
+    """raise_for_status() failure of the stdlib client; .response is the StdlibResponse"""
+
+    def __init__(self, message: str, response: "StdlibResponse"):
+        super().__init__(message)
+        self.response = response
+
+
+HTTPError = requests.HTTPError if requests is not None else StdlibHTTPError
+
+
+class StdlibResponse:
+    """The parts of requests.Response the watcher uses, over an http.client response"""
+
+    def __init__(self, url: str, response: http.client.HTTPResponse, release: Callable[[bool], None], stream: bool):
+        self.url = url
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self._response = response
+        self._release = release
+        self._content: Optional[bytes] = None
+        if not stream:
+            self._content = response.read()
+            release(True)
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = self._response.read()
+            self._release(True)
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        if self._content is not None:
+            yield self._content
+            return
+        while True:
+            chunk = self._response.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        self._content = b""
+        self._release(True)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise StdlibHTTPError(f"{self.status_code} {self.reason} for url: {self.url}", self)
+
+    def close(self) -> None:
+        if self._content is None:
+            # Nothing to read after a 304 or 204; otherwise the unread body makes the connection unusable
+            empty = self._response.length == 0
+            if empty:
+                self._response.read()
+            self._content = b""
+            self._release(empty)
+
+    def __enter__(self) -> "StdlibResponse":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class StdlibSession:
+    """Keep-alive HTTP client on http.client for WATCHER_RUNTIME=stdlib or when requests is missing.
+
+    Covers what the watcher uses of requests.Session: get/post with headers,
+    cookies, json= or data=, (connect, read) timeouts and streamed bodies.
+    Up to per_host idle connections are kept per (scheme, host, port), and a
+    request on a connection the server has since closed is retried once on a
+    fresh one. Redirects are not followed.
+    """
+
+    def __init__(self, per_host: int = HTTP_POOL_PER_HOST):
+        self.per_host = per_host
+        self.headers: Dict[str, str] = {"User-Agent": "axebch-watcher", "Accept-Encoding": "identity"}
+        self.cookies: Dict[str, str] = {}
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> StdlibResponse:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> StdlibResponse:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                cookies: Optional[Dict[str, str]] = None, data: Any = None, timeout: Any = None,
+                stream: bool = False, **kwargs) -> StdlibResponse:
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        send_headers = dict(self.headers)
+        send_headers.update(headers or {})
+        jar = dict(self.cookies)
+        jar.update(cookies or {})
+        if jar:
+            send_headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in jar.items())
+        body = data
+        if kwargs.get("json") is not None:
+            body = json.dumps(kwargs["json"]).encode("utf-8")
+            send_headers["Content-Type"] = "application/json"
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+        for attempt in range(2):
+            conn, reused = self._checkout(key, connect_timeout)
+            try:
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, target, body=body, headers=send_headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # the server dropped an idle keep-alive connection
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            return StdlibResponse(url, response, lambda reusable, c=conn, r=response: self._checkin(key, c, r, reusable), stream)
+        raise http.client.RemoteDisconnected("connection closed")  # not reached
+
+    def _checkout(self, key: Tuple[str, str, int], connect_timeout: Optional[float]) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == "https":
+            import ssl
+            conn = http.client.HTTPSConnection(host, port, timeout=connect_timeout, context=ssl.create_default_context())
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=connect_timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, False
+
+    def _checkin(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection,
+                 response: http.client.HTTPResponse, reusable: bool) -> None:
+        if not reusable or response.will_close:
+            conn.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def mount(self, prefix: str, adapter: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def new_session(per_host: int = HTTP_POOL_PER_HOST, hosts: int = HTTP_POOL_HOSTS) -> Any:
+    """requests.Session with a keep-alive pool, or StdlibSession when running without requests"""
+    if requests is None:
+        return StdlibSession(per_host)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=per_host, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session: Optional[Any] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> Any:
+    """Shared keep-alive session so polls reuse connections to the pool API"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = new_session()
+                session.headers.update({"Accept": "application/json"})
+                if PROXY_TOKEN:
+                    if requests is None:
+                        session.cookies["UMBREL_PROXY_TOKEN"] = PROXY_TOKEN
+                    else:
+                        session.cookies.set("UMBREL_PROXY_TOKEN", PROXY_TOKEN)
+                _session = session
+    return _session
+
+
+# Last body seen per URL with its validators: { url: (etag, last_modified, data) }
+_conditional_cache: Dict[str, Tuple[Optional[str], Optional[str], Dict[str, Any]]] = {}
+
+
+def get_json_if_changed(url: str, endpoint: str, proxy_token: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """Conditional GET: returns (data, changed), reusing the cached body on a 304.
+
+    Validators are only sent once the API has handed out an ETag or
+    Last-Modified, so servers without support get a plain GET.
+    """
+    headers = {}
+    cached = _conditional_cache.get(url)
+    if cached is not None:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    cookies = {"UMBREL_PROXY_TOKEN": proxy_token} if proxy_token else None
+    try:
+        with Metrics.fetch_seconds.time(endpoint):
+            r = get_session().get(url, headers=headers, cookies=cookies, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        if r.status_code == 304 and cached is not None:
+            return cached[2], False
+        r.raise_for_status()
+        with Metrics.parse_seconds.time(endpoint):
+            data = r.json()
+    except Exception:
+        Metrics.errors.inc(label_value=f"fetch_{endpoint}")
+        raise
+    data = data if isinstance(data, dict) else {"_raw": data}
+
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if etag or last_modified:
+        _conditional_cache[url] = (etag, last_modified, data)
+    else:
+        _conditional_cache.pop(url, None)
+    return data, True
+
+
+
+# The only worker fields the watcher uses; everything else is dropped while parsing
+WORKER_FIELDS = ("workername", "bestever", "lastshare_ago_s", "hashrate1m", "hashrate")
+
+
+class WorkersStream:
+    """Incremental parser for a /api/pool/workers response body.
+
+    Iterating yields each `workers_details` entry reduced to WORKER_FIELDS,
+    decoding one entry at a time from CHUNK_SIZE reads, so memory stays flat
+    however many workers the pool reports. The rest of the top-level object
+    is available as `top` once iteration has finished.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    ARRAY_START = re.compile(r'"workers_details"\s*:\s*\[')
+    SEPARATORS = " \t\r\n,"
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+        self.top: Dict[str, Any] = {}
+        self._eof = False
+
+    def _read(self) -> Optional[str]:
+        if self._eof:
+            return None
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self._eof = True
+            return self.text.decode(b"", final=True)
+        return self.text.decode(chunk)
+
+    def _parse_top(self, text: str) -> None:
+        try:
+            top = json.loads(text)
+        except ValueError:
+            return
+        self.top = top if isinstance(top, dict) else {}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        buf = ""
+        while True:
+            match = self.ARRAY_START.search(buf)
+            if match:
+                break
+            more = self._read()
+            if more is None:
+                self._parse_top(buf)  # no workers array at all
+                return
+            buf += more
+
+        prefix = buf[:match.start()]
+        buf = buf[match.end():]
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in self.SEPARATORS:
+                pos += 1
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    pos += 1
+                    break
+                try:
+                    item, pos = self.decoder.raw_decode(buf, pos)
+                except ValueError:
+                    pass  # entry continues in the next chunk
+                else:
+                    if isinstance(item, dict):
+                        yield {k: item[k] for k in WORKER_FIELDS if k in item}
+                    continue
+            more = self._read()
+            if more is None:
+                raise ValueError("workers_details ended before its closing bracket")
+            buf = buf[pos:] + more
+            pos = 0
+
+        suffix = buf[pos:]
+        while True:
+            more = self._read()
+            if more is None:
+                break
+            suffix += more
+        self._parse_top(prefix + '"workers_details": []' + suffix)
+
+
+# Validators for streamed URLs, whose bodies are never kept: { url: (etag, last_modified) }
+_stream_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+
+def stream_workers_if_changed(url: str, proxy_token: Optional[str], consume: Callable[[WorkersStream], Any]) -> Optional[Tuple[Dict[str, Any], Any]]:
+    """Conditional streaming GET of a workers list.
+
+    Returns None on a 304, else (top-level fields, consume(stream)). The
+    response is consumed inside this call so the connection goes straight
+    back to the keep-alive pool.
+    """
+    headers = {}
+    etag, last_modified = _stream_validators.get(url, (None, None))
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    cookies = {"UMBREL_PROXY_TOKEN": proxy_token} if proxy_token else None
+
+    try:
+        with Metrics.fetch_seconds.time("workers"):
+            r = get_session().get(url, headers=headers, cookies=cookies, stream=True,
+                                  timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        with r:
+            if r.status_code == 304 and (etag or last_modified):
+                return None
+            r.raise_for_status()
+            stream = WorkersStream(r.iter_content(chunk_size=WorkersStream.CHUNK_SIZE))
+            with Metrics.parse_seconds.time("workers"):
+                result = consume(stream)
+    except Exception:
+        Metrics.errors.inc(label_value="fetch_workers")
+        raise
+
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if etag or last_modified:
+        _stream_validators[url] = (etag, last_modified)
+    else:
+        _stream_validators.pop(url, None)
+    return stream.top, result
 
 
 def format_mining_number(value: int) -> str:
@@ -118,11 +2165,8 @@ def progress_bar(ratio: float, width: int = 16) -> str:
 
 from datetime import datetime, timezone
 
-def discord_post_ath(display, bestever, worker_data, pool_data):
-    embed_color = 706958  # BCH green
-
-    best_formatted = format_mining_number(bestever)
-
+def pool_context(pool_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Pool-derived embed fields, built once per poll and shared by every ATH in it"""
     net_diff = pool_data.get("network_difficulty")
     diff_int = None
     diff_formatted = "—"
@@ -134,6 +2178,60 @@ def discord_post_ath(display, bestever, worker_data, pool_data):
     except Exception:
         diff_int = None
 
+    return {
+        "network_difficulty": diff_int,
+        "difficulty_text": diff_formatted,
+        "network_height": pool_data.get("network_height"),
+        "eta_text": pool_data.get("eta_text"),
+    }
+
+
+class PoolStatsCache:
+    """On-demand /api/pool stats, kept until the TTL expires or the chain height moves"""
+
+    def __init__(self, ttl: float = POOL_STATS_TTL):
+        self.ttl = ttl
+        self._ctx: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+
+    def observe_height(self, height: Any) -> None:
+        """Drop cached stats if another response reveals a new block"""
+        if self._ctx is not None and height is not None and height != self._ctx.get("network_height"):
+            self._ctx = None
+
+    def context(self, url: str, proxy_token: Optional[str] = None) -> Dict[str, Any]:
+        if self._ctx is None or time.monotonic() - self._fetched_at >= self.ttl:
+            pool_data, _ = get_json_if_changed(url, "pool", proxy_token)
+            self._ctx = pool_context(pool_data)
+            self._fetched_at = time.monotonic()
+        return self._ctx
+
+
+def make_ath_event(pool, raw_name, display, bestever, worker_data, pool_ctx) -> Dict[str, Any]:
+    """Snapshot everything the notification needs at detection time"""
+    event = {
+        "id": f"{pool_worker_key(pool, raw_name)}:{bestever}",
+        "pool": pool,
+        "worker": raw_name,
+        "display": display,
+        "bestever": bestever,
+        "lastshare_ago_s": worker_data.get("lastshare_ago_s"),
+        "detected_at": datetime.now(timezone.utc).isoformat(),
+    }
+    event.update(pool_ctx)
+    return event
+
+
+def build_ath_embed(event: Dict[str, Any]) -> Dict[str, Any]:
+    embed_color = 706958  # BCH green
+
+    display = event["display"]
+    bestever = event["bestever"]
+    best_formatted = format_mining_number(bestever)
+
+    diff_int = event.get("network_difficulty")
+    diff_formatted = event.get("difficulty_text") or "—"
+
     # Progress = best share / difficulty
     ratio = 0.0
     if diff_int and diff_int > 0:
@@ -141,8 +2239,8 @@ def discord_post_ath(display, bestever, worker_data, pool_data):
 
     bar_text = progress_bar(ratio, width=18)
 
-    height = pool_data.get("network_height")
-    eta_text = pool_data.get("eta_text")
+    height = event.get("network_height")
+    eta_text = event.get("eta_text")
 
     fields = [
         {"name": "🏷 Worker", "value": f"**{display}**", "inline": True},
@@ -157,33 +2255,724 @@ def discord_post_ath(display, bestever, worker_data, pool_data):
     if eta_text:
         fields.append({"name": "⏳ ETA", "value": f"`{eta_text}`", "inline": True})
 
-    if worker_data.get("lastshare_ago_s") is not None:
+    if event.get("luck") is not None:
+        fields.append({"name": "🍀 Luck", "value": f"`{event['luck']:.0f}th percentile`", "inline": True})
+
+    if event.get("block_odds_30d") is not None:
+        fields.append({"name": "🎲 Block in 30d", "value": f"`{event['block_odds_30d'] * 100:.2f}%`", "inline": True})
+
+    if event.get("replaced"):
+        fields.append({"name": "🔁 Replaced", "value": f"`{event['replaced']} earlier record(s)`", "inline": True})
+
+    if event.get("farm_best") and event.get("previous_farm_best"):
+        fields.append({"name": "🏆 Previous Farm Best",
+                       "value": f"`{format_mining_number(event['previous_farm_best'])}`", "inline": True})
+
+    if event.get("lastshare_ago_s") is not None:
         fields.append({
             "name": "⏱ Last Share Ago",
-            "value": f"`{worker_data.get('lastshare_ago_s')}s`",
+            "value": f"`{event.get('lastshare_ago_s')}s`",
             "inline": True
         })
 
-    payload = {
-        "username": "AxeBCH",
-        "embeds": [{
-            "title": "🔥 NEW WORKER ATH!",
-            "description": f"**{display}** just hit a new best share!",
-            "color": embed_color,
-            "thumbnail": {"url": "https://cryptologos.cc/logos/bitcoin-cash-bch-logo.png"},
-            "fields": fields,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "footer": {"text": "AxeBCH Solo Node"},
-        }]
+    pool = event.get("pool", DEFAULT_POOL)
+    footer = "AxeBCH Solo Node" if pool == DEFAULT_POOL else f"AxeBCH Solo Node · {pool}"
+
+    if event.get("farm_best"):
+        title, description = "🏆 NEW FARM BEST!", f"**{display}** just hit the best share of the whole farm!"
+    else:
+        title, description = "🔥 NEW WORKER ATH!", f"**{display}** just hit a new best share!"
+
+    return {
+        "title": title,
+        "description": description,
+        "color": embed_color,
+        "thumbnail": {"url": "https://cryptologos.cc/logos/bitcoin-cash-bch-logo.png"},
+        "fields": fields,
+        "timestamp": event.get("detected_at") or datetime.now(timezone.utc).isoformat(),
+        "footer": {"text": footer},
     }
 
+
+# Discord limits per webhook message
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_EMBED_CHARS = 6000
+
+
+def build_test_embed() -> Dict[str, Any]:
+    return {
+        "title": "✅ AxeBCH watcher connected",
+        "description": "This is a test message. New worker all-time highs will be posted here.",
+        "color": 706958,
+        "footer": {"text": f"Watching {', '.join(p['name'] for p in get_pools())}"},
+    }
+
+
+def send_test_message(webhook: str) -> None:
+    dispatcher = DiscordDispatcher()
+    try:
+        dispatcher.send(webhook, [build_test_embed()])
+    finally:
+        dispatcher.session.close()
+
+
+def embed_text_length(embed: Dict[str, Any]) -> int:
+    """Characters Discord counts against the per-message embed budget"""
+    total = len(embed.get("title", "")) + len(embed.get("description", ""))
+    total += len(embed.get("footer", {}).get("text", ""))
+    for field in embed.get("fields", []):
+        total += len(field["name"]) + len(field["value"])
+    return total
+
+
+def batch_embeds(events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group events into webhook messages within Discord's embed count and size limits"""
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_chars = 0
+    for event in events:
+        chars = embed_text_length(build_ath_embed(event))
+        if current and (len(current) >= DISCORD_MAX_EMBEDS or current_chars + chars > DISCORD_MAX_EMBED_CHARS):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(event)
+        current_chars += chars
+    if current:
+        batches.append(current)
+    return batches
+
+
+class DiscordDispatcher:
+    """Posts webhook messages on a keep-alive session while honouring Discord rate limits.
+
+    Tracks the X-RateLimit-* bucket of the webhook and waits for the reset
+    instead of spending a request that would be rejected; a 429 is retried after
+    its retry_after rather than surfaced as a failure.
+    """
+
+    MAX_RATE_LIMIT_WAITS = 5
+
+    def __init__(self, session: Optional[Any] = None):
+        self.session = session or new_session()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+
+    def _wait_for_bucket(self) -> None:
+        if self.remaining == 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.remaining = None
+
+    def _record_bucket(self, r: Any) -> None:
+        try:
+            remaining = r.headers.get("X-RateLimit-Remaining")
+            reset_after = r.headers.get("X-RateLimit-Reset-After")
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset_after is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _retry_after(r: Any) -> float:
+        try:
+            return float(r.json().get("retry_after"))
+        except Exception:
+            pass
+        try:
+            return float(r.headers.get("Retry-After", "1"))
+        except ValueError:
+            return 1.0
+
+    def send(self, webhook: str, embeds: List[Dict[str, Any]]) -> None:
+        payload = {"username": "AxeBCH", "embeds": embeds}
+        for _ in range(self.MAX_RATE_LIMIT_WAITS):
+            self._wait_for_bucket()
+            with Metrics.webhook_seconds.time():
+                r = self.session.post(webhook, json=payload, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+            self._record_bucket(r)
+            if r.status_code != 429:
+                r.raise_for_status()
+                return
+            delay = self._retry_after(r)
+            print(f"[notify] rate limited by Discord, waiting {delay:.1f}s")
+            time.sleep(delay)
+        r.raise_for_status()
+
+
+class NotificationOutbox:
+    """Durable queue of ATH notifications waiting for delivery to one or more sinks.
+
+    The journal is append-only JSON lines: {"op": "add", "event": {...}} when an
+    ATH is detected (event["sinks"] names the sinks it was routed to) and
+    {"op": "ack", "id": ..., "sink": ...} once one sink delivered (or dropped)
+    it; an ack without "sink" finishes the event everywhere. Replaying it at
+    startup restores whatever was still pending. Once the queue drains the
+    journal is compacted down to the most recent acks, which are kept so a
+    re-detected ATH is not delivered a second time.
+    """
+
+    KEEP_ACKED = 256
+    COMPACT_AFTER_LINES = 1024
+    # Events journaled before sinks existed went to the settings webhook
+    LEGACY_SINKS = ("discord",)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._remaining: Dict[str, set] = {}  # event id -> sinks that still have to deliver it
+        self._claimed: set = set()  # (sink, event id) being delivered right now
+        self._acked: "OrderedDict[str, None]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._lines = 0
+        self.lease: Optional[WriterLease] = None
+        self._replay()
+        self._journal = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self) -> None:
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    continue  # torn final line after a crash
+                if record.get("op") == "add":
+                    event = record.get("event") or {}
+                    event_id = event.get("id")
+                    if event_id and event_id not in self._acked:
+                        self._pending[event_id] = event
+                        self._remaining[event_id] = set(event.get("sinks", self.LEGACY_SINKS))
+                elif record.get("op") == "ack":
+                    self._mark_acked(record.get("id"), record.get("sink"))
+
+    def _mark_acked(self, event_id: Optional[str], sink: Optional[str]) -> None:
+        remaining = self._remaining.get(event_id)
+        if sink is not None:
+            self._claimed.discard((sink, event_id))
+            if remaining is not None:
+                remaining.discard(sink)
+                if remaining:
+                    return
+        self._pending.pop(event_id, None)
+        self._remaining.pop(event_id, None)
+        if not event_id:
+            return
+        self._acked[event_id] = None
+        self._acked.move_to_end(event_id)
+        while len(self._acked) > self.KEEP_ACKED:
+            self._acked.popitem(last=False)
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        if self.lease is not None:
+            self.lease.check()
+        for record in records:
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._lines += len(records)
+
+    def enqueue(self, events: List[Dict[str, Any]]) -> None:
+        """Persist routed events before returning; duplicates of pending or delivered ids are ignored"""
+        with self._cond:
+            fresh = [e for e in events if e.get("sinks") and e["id"] not in self._pending and e["id"] not in self._acked]
+            if not fresh:
+                return
+            self._append([{"op": "add", "event": e} for e in fresh])
+            for e in fresh:
+                self._pending[e["id"]] = e
+                self._remaining[e["id"]] = set(e["sinks"])
+            self._cond.notify_all()
+
+    def claim(self, sink: str, limit: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Wait for events this sink still has to deliver and no other thread is delivering; oldest first"""
+        with self._cond:
+            claimed = self._unclaimed(sink, limit)
+            if not claimed:
+                self._cond.wait(timeout)
+                claimed = self._unclaimed(sink, limit)
+            self._claimed.update((sink, e["id"]) for e in claimed)
+            return claimed
+
+    def _unclaimed(self, sink: str, limit: int) -> List[Dict[str, Any]]:
+        found = []
+        for event_id, event in self._pending.items():
+            if sink in self._remaining[event_id] and (sink, event_id) not in self._claimed:
+                found.append(event)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def release(self, sink: str, event_ids: List[str]) -> None:
+        """Give claimed events back after a failed attempt"""
+        with self._cond:
+            self._claimed.difference_update((sink, i) for i in event_ids)
+            self._cond.notify_all()
+
+    def ack(self, event_ids: List[str], sink: Optional[str] = None) -> None:
+        with self._cond:
+            self._append([{"op": "ack", "id": i, "sink": sink} if sink else {"op": "ack", "id": i} for i in event_ids])
+            for i in event_ids:
+                self._mark_acked(i, sink)
+            if not self._pending and self._lines >= self.COMPACT_AFTER_LINES:
+                self._compact()
+
+    def retire_sinks(self, active: Iterable[str]) -> int:
+        """Ack pending deliveries for sinks that are no longer configured; returns how many"""
+        active = set(active)
+        with self._cond:
+            stale = [(sink, event_id) for event_id, sinks in self._remaining.items()
+                     for sink in sinks if sink not in active]
+        for sink, event_id in stale:
+            self.ack([event_id], sink)
+        return len(stale)
+
+    def _compact(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for event_id in self._acked:
+                f.write(json.dumps({"op": "ack", "id": event_id}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp, self.path)
+        fsync_dir(self.path)
+        self._journal = open(self.path, "a", encoding="utf-8")
+        self._lines = len(self._acked)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+
+DELIVERY_BACKOFF_MIN = float(os.getenv("DELIVERY_BACKOFF_MIN", "2"))
+DELIVERY_BACKOFF_MAX = float(os.getenv("DELIVERY_BACKOFF_MAX", "300"))
+
+
+class SinkRejected(Exception):
+    """The destination refused the message itself; retrying will not help"""
+
+
+def event_progress(event: Dict[str, Any]) -> Optional[float]:
+    """Best share as a fraction of the network difficulty"""
+    difficulty = event.get("network_difficulty")
+    return event["bestever"] / difficulty if difficulty else None
+
+
+def ath_summary(event: Dict[str, Any]) -> str:
+    text = f"{event['display']} hit a new best share of {format_mining_number(event['bestever'])}"
+    progress = event_progress(event)
+    if progress is not None:
+        text += f" ({progress * 100:.4g}% of block difficulty)"
+    if event.get("pool", DEFAULT_POOL) != DEFAULT_POOL:
+        text += f" on {event['pool']}"
+    if event.get("replaced"):
+        text += f", replacing {event['replaced']} earlier record(s)"
+    if event.get("farm_best"):
+        text += " - a new best for the whole farm"
+    return text
+
+
+class SinkRules:
+    """Which events a sink wants: every condition that is set must match.
+
+    min_progress      best share / network difficulty at least this
+    pools             pool names
+    workers           fnmatch patterns on the worker's raw or display name
+    exclude_workers   patterns that veto a match
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Any]]):
+        rules = rules or {}
+        self.min_progress = float(rules["min_progress"]) if rules.get("min_progress") is not None else None
+        self.pools = set(self._list(rules.get("pools"))) or None
+        self.workers = self._compile(rules.get("workers"))
+        self.exclude = self._compile(rules.get("exclude_workers"))
+
+    @staticmethod
+    def _list(value: Any) -> List[str]:
+        if value is None:
+            return []
+        return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+
+    def _compile(self, patterns: Any) -> Optional["re.Pattern"]:
+        patterns = self._list(patterns)
+        if not patterns:
+            return None
+        return re.compile("|".join(fnmatch.translate(p) for p in patterns), re.IGNORECASE)
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.pools is not None and event.get("pool", DEFAULT_POOL) not in self.pools:
+            return False
+        names = (event.get("worker", ""), event.get("display", ""))
+        if self.workers is not None and not any(self.workers.match(n) for n in names):
+            return False
+        if self.exclude is not None and any(self.exclude.match(n) for n in names):
+            return False
+        if self.min_progress is not None:
+            progress = event_progress(event)
+            if progress is None or progress < self.min_progress:
+                return False
+        return True
+
+
+class Sink(ABC):
+    """One notification destination with its own connection pool, concurrency and retry policy.
+
+    Config keys shared by every type: name, type, concurrency (parallel
+    deliveries, default 1), backoff_min / backoff_max (seconds), max_attempts
+    (0 retries forever) and rules (see SinkRules).
+    """
+
+    kind = ""
+    batch_limit = 1
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.name = config["name"]
+        self.concurrency = max(1, int(config.get("concurrency", 1)))
+        self.backoff_min = float(config.get("backoff_min", DELIVERY_BACKOFF_MIN))
+        self.backoff_max = float(config.get("backoff_max", DELIVERY_BACKOFF_MAX))
+        self.max_attempts = int(config.get("max_attempts", 0))
+        self.rules = SinkRules(config.get("rules"))
+        self.backoff = 0.0
+        self.attempts: Dict[str, int] = {}
+        self.session = new_session(self.concurrency, hosts=1)
+
+    def batches(self, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return [[event] for event in events]
+
+    @abstractmethod
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        """Deliver one batch; raise SinkRejected if the destination refuses it, anything else to retry"""
+
+    def post(self, url: str, **kwargs) -> Any:
+        r = self.session.post(url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), **kwargs)
+        if 400 <= r.status_code < 500 and r.status_code not in (401, 403, 404, 408, 429):
+            raise SinkRejected(f"{r.status_code} {r.reason}")
+        r.raise_for_status()
+        return r
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class DiscordSink(Sink):
+    """Discord webhook (url); ATHs are batched into as few messages as Discord allows"""
+
+    kind = "discord"
+    batch_limit = 50
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.dispatcher = DiscordDispatcher(self.session)
+
+    def batches(self, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return batch_embeds(events)
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.dispatcher.send(self.config["url"], [build_ath_embed(event) for event in batch])
+        except HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and 400 <= status < 500 and status not in (401, 403, 404, 429):
+                raise SinkRejected(str(e)) from e
+            raise
+
+
+class HttpSink(Sink):
+    """Generic JSON POST of {"events": [...]} to url, with optional extra headers"""
+
+    kind = "http"
+    batch_limit = 50
+
+    def batches(self, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return [events]
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        self.post(self.config["url"], json={"events": batch}, headers=self.config.get("headers") or {})
+
+
+class NtfySink(Sink):
+    """ntfy-style push: one plain-text POST per ATH to url (a topic), with optional token"""
+
+    kind = "ntfy"
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        event = batch[0]
+        headers = {"Title": "New worker ATH", "Tags": "pick", "Priority": str(self.config.get("priority", 3))}
+        if self.config.get("token"):
+            headers["Authorization"] = f"Bearer {self.config['token']}"
+        self.post(self.config["url"], data=ath_summary(event).encode("utf-8"), headers=headers)
+
+
+class FileSink(Sink):
+    """Appends each ATH as a JSON line to path"""
+
+    kind = "file"
+    batch_limit = 100
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.lock = threading.Lock()
+
+    def batches(self, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return [events]
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in batch)
+        with self.lock, open(self.config["path"], "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class ExecSink(Sink):
+    """Runs command (a list, or a string run by the shell) per ATH with the event as JSON on stdin"""
+
+    kind = "exec"
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        command = self.config["command"]
+        result = subprocess.run(command, shell=isinstance(command, str), input=json.dumps(batch[0]).encode("utf-8"),
+                                capture_output=True, timeout=float(self.config.get("timeout", 30)))
+        if result.returncode != 0:
+            raise RuntimeError(f"exit {result.returncode}: {result.stderr.decode('utf-8', 'replace').strip()[:200]}")
+
+
+SINK_TYPES = {cls.kind: cls for cls in (DiscordSink, HttpSink, NtfySink, FileSink, ExecSink)}
+
+
+def get_sink_configs() -> List[Dict[str, Any]]:
+    """Notification destinations: the `sinks` list in settings plus the settings webhook as sink "discord".
+
+    Each entry needs a `type` from SINK_TYPES and that type's target (url,
+    path or command); the name defaults to the type plus its position.
+    """
+    settings = load_settings()
+    if _sink_configs[0] is settings:
+        return _sink_configs[1]
+    configs: List[Dict[str, Any]] = []
+    seen = set()
+    configured = settings.get("sinks")
+    for i, entry in enumerate(configured if isinstance(configured, list) else [], 1):
+        if not isinstance(entry, dict) or entry.get("type") not in SINK_TYPES:
+            continue
+        name = str(entry.get("name") or f"{entry['type']}{i}").strip()
+        if name in seen:
+            continue
+        seen.add(name)
+        configs.append(dict(entry, name=name))
     webhook = get_webhook()
-    if not webhook:
-        return
+    if webhook and "discord" not in seen:
+        configs.insert(0, {"name": "discord", "type": "discord", "url": webhook})
+    _sink_configs[:] = [settings, configs]
+    return configs
+
+
+_sink_configs: List[Any] = [None, []]
+_sink_rules: Dict[str, Tuple[Dict[str, Any], SinkRules]] = {}
+
+
+def route_events(events: List[Dict[str, Any]]) -> None:
+    """Evaluate every sink's rules once per event and record the matches in event["sinks"]"""
+    configs = get_sink_configs()
+    rules = []
+    for config in configs:
+        cached = _sink_rules.get(config["name"])
+        if cached is None or cached[0] != config.get("rules"):
+            cached = _sink_rules[config["name"]] = (config.get("rules"), SinkRules(config.get("rules")))
+        rules.append((config["name"], cached[1]))
+    for event in events:
+        event["sinks"] = [name for name, rule in rules if rule.matches(event)]
+
 
-    r = requests.post(webhook, json=payload, timeout=15)
-    r.raise_for_status()
+class DeliveryWorker(threading.Thread):
+    """Drains one sink's share of the outbox, retrying with the sink's exponential backoff"""
 
+    CLAIM_TIMEOUT = 5
+
+    def __init__(self, outbox: NotificationOutbox, sink: Sink, index: int = 0):
+        super().__init__(name=f"deliver:{sink.name}:{index}", daemon=True)
+        self.outbox = outbox
+        self.sink = sink
+        self.stopped = False
+
+    def run(self) -> None:
+        sink = self.sink
+        while not self.stopped:
+            pending = self.outbox.claim(sink.name, sink.batch_limit, timeout=self.CLAIM_TIMEOUT)
+            if not pending:
+                continue
+            if self.stopped:
+                self.outbox.release(sink.name, [e["id"] for e in pending])
+                break
+            batches = sink.batches(pending)
+            for n, batch in enumerate(batches):
+                if not self.deliver(batch):
+                    rest = [e["id"] for b in batches[n:] for e in b]
+                    self.outbox.release(sink.name, rest)
+                    self.wait_backoff()
+                    break
+
+    def deliver(self, batch: List[Dict[str, Any]]) -> bool:
+        sink = self.sink
+        ids = [event["id"] for event in batch]
+        if self.outbox.lease is not None:
+            self.outbox.lease.check()
+        try:
+            with Metrics.sink_seconds.time(sink.name):
+                sink.send(batch)
+        except SinkRejected as e:
+            print(f"[notify {sink.name}] dropping {len(ids)} ATH(s) {', '.join(ids)}: {e}")
+            Metrics.errors.inc(label_value="sink_rejected")
+            self.outbox.ack(ids, sink.name)
+            return True
+        except Exception as e:
+            Metrics.errors.inc(label_value="delivery")
+            EVENTS.publish("error", stage=f"sink:{sink.name}", error=str(e))
+            given_up = self.count_attempts(ids)
+            if given_up:
+                print(f"[notify {sink.name}] giving up on {len(given_up)} ATH(s) after {sink.max_attempts} attempts: {e}")
+                self.outbox.ack(given_up, sink.name)
+            sink.backoff = min(max(sink.backoff * 2, sink.backoff_min), sink.backoff_max)
+            print(f"[notify {sink.name}] delivery of {len(ids)} ATH(s) failed: {e}; retrying in {sink.backoff:.1f}s")
+            return False
+
+        self.outbox.ack(ids, sink.name)
+        sink.backoff = 0.0
+        for i in ids:
+            sink.attempts.pop(i, None)
+        Metrics.notifications.inc(len(ids), sink.name)
+        Metrics.outbox_pending.set(len(self.outbox))
+        names = ", ".join(f"{e['display']} ({format_mining_number(e['bestever'])})" for e in batch)
+        print(f"[notify {sink.name}] delivered {len(batch)} ATH(s): {names}")
+        return True
+
+    def count_attempts(self, ids: List[str]) -> List[str]:
+        """Failed attempt bookkeeping; returns ids that reached the sink's max_attempts"""
+        sink = self.sink
+        if sink.max_attempts <= 0:
+            return []
+        given_up = []
+        for i in ids:
+            sink.attempts[i] = sink.attempts.get(i, 0) + 1
+            if sink.attempts[i] >= sink.max_attempts:
+                given_up.append(i)
+                sink.attempts.pop(i)
+        return given_up
+
+    def wait_backoff(self) -> None:
+        deadline = time.monotonic() + self.sink.backoff
+        while not self.stopped and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
+
+
+class NotificationRouter(threading.Thread):
+    """Keeps one set of DeliveryWorkers per configured sink, so sinks deliver in parallel.
+
+    Re-reads the sink list every RECONCILE_SECONDS (or when woken): changed
+    sinks get fresh workers and a fresh connection pool, and deliveries still
+    pending for removed sinks are dropped from the outbox.
+    """
+
+    RECONCILE_SECONDS = 5
+
+    def __init__(self, outbox: NotificationOutbox):
+        super().__init__(name="router", daemon=True)
+        self.outbox = outbox
+        self.sinks: Dict[str, Tuple[Dict[str, Any], Sink, List[DeliveryWorker]]] = {}
+        self.wake = threading.Event()
+        self.stopped = False
+
+    def run(self) -> None:
+        while not self.stopped:
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"[notify] could not apply sink settings: {e}")
+            self.wake.wait(self.RECONCILE_SECONDS)
+            self.wake.clear()
+
+    def reconcile(self) -> None:
+        configs = {config["name"]: config for config in get_sink_configs()}
+        if not configs:
+            return  # nowhere to deliver yet; keep everything pending until a sink is configured
+        for name in list(self.sinks):
+            if configs.get(name) != self.sinks[name][0]:
+                self.stop(name)
+        for name, config in configs.items():
+            if name in self.sinks:
+                continue
+            sink = SINK_TYPES[config["type"]](config)
+            workers = [DeliveryWorker(self.outbox, sink, i) for i in range(sink.concurrency)]
+            self.sinks[name] = (config, sink, workers)
+            for worker in workers:
+                worker.start()
+            print(f"[notify] Delivering to {sink.kind} sink {name} ({sink.concurrency} at a time)")
+        retired = self.outbox.retire_sinks(configs)
+        if retired:
+            print(f"[notify] dropped {retired} pending delivery(ies) for removed sinks")
+
+    def stop(self, name: str) -> None:
+        _, sink, workers = self.sinks.pop(name)
+        for worker in workers:
+            worker.stopped = True
+        sink.close()
+        print(f"[notify] Stopped sink {name}")
+
+    def drain(self, timeout: float) -> None:
+        """Stop every sink and give in-flight deliveries up to timeout seconds to finish and ack"""
+        self.stopped = True
+        self.wake.set()
+        if self.is_alive():
+            self.join()
+        workers = [worker for _, _, ws in self.sinks.values() for worker in ws]
+        for name in list(self.sinks):
+            self.stop(name)
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+
+class PollScheduler:
+    """Adaptive delay between polls.
+
+    Right after activity (a worker's best changed) the watcher polls at the
+    minimum interval, since ATHs tend to arrive in bursts. Each quiet poll
+    backs off by IDLE_FACTOR, through the configured poll_seconds and on up to
+    the idle maximum, so an idle farm is polled less; consecutive API errors
+    back off exponentially up to the maximum.
+    """
+
+    IDLE_FACTOR = 1.5
+    ERROR_FACTOR = 2.0
+
+    def __init__(self):
+        self.delay: Optional[float] = None
+        self.errors = 0
+
+    def next_delay(self, activity: bool, error: bool = False, pool: Optional[Dict[str, Any]] = None) -> float:
+        poll_seconds = float((pool or {}).get("poll_seconds") or get_poll_seconds())
+        min_seconds, max_seconds, idle_max_seconds = get_poll_bounds(poll_seconds, pool)
+        delay = self.delay if self.delay is not None else poll_seconds
+
+        if error:
+            self.errors += 1
+            delay = min(max(delay, poll_seconds) * self.ERROR_FACTOR, max_seconds)
+        elif activity:
+            self.errors = 0
+            delay = min_seconds
+        else:
+            self.errors = 0
+            delay = min(delay * self.IDLE_FACTOR, idle_max_seconds)
+
+        self.delay = max(min_seconds, min(delay, max(max_seconds, idle_max_seconds)))
+        return self.delay
 
 
 def pretty_worker_name(workername: str) -> str:
@@ -195,86 +2984,1056 @@ def pretty_worker_name(workername: str) -> str:
     return suffix.title() if suffix else "Unknown"
 
 
-def main():
-    state = load_state()
+def _moved(value: float, previous: float) -> bool:
+    return value != previous and not (math.isnan(value) and math.isnan(previous))
 
-    # Persisted map: { "<raw workername>": bestever_int }
-    last_bestever: Dict[str, int] = state.get("last_bestever", {})
-    if not isinstance(last_bestever, dict):
-        last_bestever = {}
-    
-    print("[watcher] Starting AxeBCH ATH Watcher...")
-    print(f"[watcher] Base URL: {get_base_url()}")
-    print(f"[watcher] State file: {STATE_FILE}")
 
-    while True:
+class WorkerRecord:
+    """Per-worker detection state; best, hashrate and first sighting live in WorkerRegistry's arrays"""
+
+    __slots__ = ("index", "name", "raw_best", "last_seen", "_display")
+
+    def __init__(self, index: int, name: str, last_seen: float):
+        self.index = index
+        self.name = name
+        self.raw_best: Any = None  # bestever exactly as the API last sent it
+        self.last_seen = last_seen
+        self._display: Optional[str] = None
+
+    @property
+    def display(self) -> str:
+        if self._display is None:
+            self._display = pretty_worker_name(self.name)
+        return self._display
+
+
+class WorkerRegistry:
+    """Compact per-pool worker index used by the detection pass.
+
+    Records are looked up by the raw `workername` value from the API, names
+    are interned, and bests, current hashrates and first-seen times are kept
+    in flat arrays indexed by record (free slots have a NaN first_seen).
+    `raised` marks bests found since first_seen; a best carried over from
+    before, such as the pool's all-time best of a newly seen worker, came
+    from hashing the watcher never saw and has no luck figure.
+    Workers not seen for `evict_seconds` are dropped from memory; their best
+    stays in the database and is looked up again if the name comes back, so
+    rotating rental names no longer grow the watcher without bound. Records
+    whose best changed, or whose hashrate or last share drifted past
+    RATE_SLACK / LAST_SHARE_SLACK from what was last published, are collected
+    for take_changes(), which feeds the backend's worker leaderboard; the
+    per-poll jitter of those two alone never makes a worker dirty.
+    """
+
+    SWEEP_SECONDS = 300
+    RATE_SLACK = 0.1  # relative
+    LAST_SHARE_SLACK = 60.0  # seconds
+
+    def __init__(self, pool: str, store: HistoryStore, evict_seconds: float):
+        self.pool = pool
+        self.store = store
+        self.evict_seconds = evict_seconds
+        self.bests = array("q")
+        self.rates = array("d")
+        self.first_seen = array("d")
+        self.raised = array("b")
+        self.last_share = array("d")
+        # Hashrate and last share as last handed out by take_changes()
+        self.shown_rates = array("d")
+        self.shown_share = array("d")
+        self.records: List[Optional[WorkerRecord]] = []
+        self.free: List[int] = []
+        self.by_key: Dict[Any, WorkerRecord] = {}
+        self.by_name: Dict[str, WorkerRecord] = {}
+        self.dirty: set = set()
+        self.removed: List[str] = []
+        self._swept_at = time.monotonic()
+        now = time.time()
+        for name, (best, first_seen, raised) in store.load_bests(pool).items():
+            self._add(name, best, now, first_seen, raised)
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def _add(self, name: str, best: int, now: float, first_seen: Optional[float] = None,
+             raised: bool = False) -> WorkerRecord:
+        name = sys.intern(name)
+        first_seen = now if first_seen is None else first_seen
+        if self.free:
+            index = self.free.pop()
+            self.bests[index] = best
+            self.rates[index] = math.nan
+            self.first_seen[index] = first_seen
+            self.raised[index] = raised
+            self.last_share[index] = math.nan
+            self.shown_rates[index] = math.nan
+            self.shown_share[index] = math.nan
+        else:
+            index = len(self.records)
+            self.bests.append(best)
+            self.rates.append(math.nan)
+            self.first_seen.append(first_seen)
+            self.raised.append(raised)
+            self.last_share.append(math.nan)
+            self.shown_rates.append(math.nan)
+            self.shown_share.append(math.nan)
+            self.records.append(None)
+        record = WorkerRecord(index, name, now)
+        self.records[index] = record
+        self.by_name[name] = record
+        self.dirty.add(record)
+        return record
+
+    def best(self, record: WorkerRecord) -> int:
+        return self.bests[record.index]
+
+    def _observe(self, record: WorkerRecord, w: Dict[str, Any], now: float) -> None:
+        """Current hashrate and last share time; marks the record changed once either drifts
+        past its slack from the published value"""
+        index = record.index
+        rate = parse_hashrate(w.get("hashrate1m", w.get("hashrate")))
         try:
-            # Get dynamic settings
-            poll_seconds = get_poll_seconds()
-            webhook = get_webhook()
-            
-            if not webhook:
-                print("[watcher] No Discord webhook configured. Waiting...")
-                time.sleep(30)
+            last_share = round(now - float(w["lastshare_ago_s"]))
+        except (KeyError, TypeError, ValueError):
+            last_share = math.nan
+        self.rates[index] = rate
+        self.last_share[index] = last_share
+        shown_rate, shown_share = self.shown_rates[index], self.shown_share[index]
+        if (_moved(rate, shown_rate) and not abs(rate - shown_rate) <= self.RATE_SLACK * shown_rate) or \
+                (_moved(last_share, shown_share) and not abs(last_share - shown_share) < self.LAST_SHARE_SLACK):
+            self.dirty.add(record)
+
+    def row(self, record: WorkerRecord) -> List[Any]:
+        """[name, display, best, hashrate, last share ts, first seen] as published to the backend"""
+        index = record.index
+        rate, last_share = self.rates[index], self.last_share[index]
+        return [record.name, record.display, self.bests[index], None if math.isnan(rate) else rate,
+                None if math.isnan(last_share) else last_share, self.first_seen[index]]
+
+    def take_changes(self) -> Tuple[List[WorkerRecord], List[str]]:
+        """Records changed and names evicted since the last call"""
+        changed, removed = [r for r in self.dirty if self.records[r.index] is r], self.removed
+        self.dirty, self.removed = set(), []
+        for record in changed:
+            self.shown_rates[record.index] = self.rates[record.index]
+            self.shown_share[record.index] = self.last_share[record.index]
+        return changed, removed
+
+    def diff(self, details: Iterable[Any], now: float):
+        """Single pass over a workers payload.
+
+        Returns (new workers, improvements, unchanged count). New workers are
+        recorded immediately; improvements are (record, new best, worker data)
+        and are only applied through commit() once their notifications are
+        journaled.
+        """
+        by_key = self.by_key
+        bests = self.bests
+        new_workers: List[Tuple[str, int]] = []
+        improved: List[Tuple[WorkerRecord, int, Dict[str, Any]]] = []
+        skipped = 0
+
+        for w in details:
+            if not isinstance(w, dict):
                 continue
-            
-            # Fetch both workers and pool data
-            data = get_json(get_workers_url())
-            details = data.get("workers_details", [])
-            if not isinstance(details, list):
-                details = []
-
-            pool_data = get_json(get_pool_url())
 
-            # Track updates, then save once per loop
-            changed = False
+            # bestever might be null; ignore if missing
+            bestever = w.get("bestever", None)
+            if bestever is None:
+                continue
 
-            for w in details:
-                if not isinstance(w, dict):
+            key = w.get("workername")
+            record = by_key.get(key)
+            if record is not None:
+                record.last_seen = now
+                self._observe(record, w, now)
+                if record.raw_best == bestever:
+                    skipped += 1
                     continue
 
-                raw_name = str(w.get("workername", "")).strip()
+            try:
+                bestever_int = int(bestever)
+            except Exception:
+                continue
+
+            if record is None:
+                raw_name = str(key or "").strip()
                 if not raw_name:
                     continue
+                record = self.by_name.get(raw_name)
+                if record is None:
+                    archived = self.store.load_best(self.pool, raw_name)
+                    if archived is None:
+                        # First time seeing this worker: record but don't notify (prevents spam on first run)
+                        record = self._add(raw_name, bestever_int, now)
+                        record.raw_best = bestever
+                        by_key[key] = record
+                        self._observe(record, w, now)
+                        new_workers.append((record.name, bestever_int))
+                        continue
+                    archived_best, first_seen, raised = archived
+                    record = self._add(raw_name, archived_best, now, first_seen, raised)
+                by_key[key] = record
+                record.last_seen = now
+                self._observe(record, w, now)
+
+            # Notify ONLY when it increases; applied by commit() once the event is queued
+            if bestever_int > bests[record.index]:
+                improved.append((record, bestever_int, w))
+            else:
+                record.raw_best = bestever
+
+        return new_workers, improved, skipped
+
+    def commit(self, improved: List[Tuple[WorkerRecord, int, Dict[str, Any]]]) -> None:
+        for record, bestever_int, w in improved:
+            self.bests[record.index] = bestever_int
+            self.raised[record.index] = True
+            record.raw_best = w.get("bestever")
+            self.dirty.add(record)
+
+    def evict_stale(self, now: float) -> List[str]:
+        """Drop workers unseen for evict_seconds; returns their names. Runs at most every SWEEP_SECONDS."""
+        if self.evict_seconds <= 0 or time.monotonic() - self._swept_at < self.SWEEP_SECONDS:
+            return []
+        self._swept_at = time.monotonic()
+        cutoff = now - self.evict_seconds
+        stale = [r for r in self.by_name.values() if r.last_seen < cutoff]
+        if not stale:
+            return []
+        for record in stale:
+            del self.by_name[record.name]
+            self.records[record.index] = None
+            self.rates[record.index] = math.nan
+            self.first_seen[record.index] = math.nan
+            self.raised[record.index] = False
+            self.last_share[record.index] = math.nan
+            self.shown_rates[record.index] = math.nan
+            self.shown_share[record.index] = math.nan
+            self.free.append(record.index)
+            self.dirty.discard(record)
+            self.removed.append(record.name)
+        gone = {id(r) for r in stale}
+        self.by_key = {k: r for k, r in self.by_key.items() if id(r) not in gone}
+        return [r.name for r in stale]
+
+
+def get_worker_evict_seconds() -> float:
+    """How long a worker may be absent before it is dropped from memory (0 disables)"""
+    return float(load_settings().get("worker_evict_hours", 168)) * 3600
+
+
+def get_ath_coalesce_seconds() -> Tuple[float, float]:
+    """(window, max delay) for merging a worker's rapid ATHs into one notification.
+
+    A 0 window sends each ATH at once. A max delay of 0 means no cap, and one
+    shorter than the window is raised to it, so it can never switch the window off.
+    """
+    settings = load_settings()
+    try:
+        window = max(float(settings.get("ath_coalesce_seconds", 0) or 0), 0.0)
+        max_delay = float(settings.get("ath_max_delay_seconds", 300) or 0)
+    except (TypeError, ValueError):
+        return 0.0, 0.0
+    return window, max(max_delay, window) if max_delay > 0 else math.inf
+
+
+class AthCoalescer:
+    """Holds each worker's latest ATH until no better one has come for `window` seconds.
+
+    A fresh worker often raises its best several times within a few polls;
+    every higher record replaces the held event (counted in event["replaced"])
+    and restarts the window, and max_delay caps how long the first one waits.
+    Seeing the held record itself again only refreshes the event.
+    The worker's best is only written to the database when its event is
+    released, so a restart in between re-detects the ATH instead of losing it.
+    """
 
-                # bestever might be null; ignore if missing
-                bestever = w.get("bestever", None)
-                if bestever is None:
-                    continue
+    def __init__(self):
+        # worker name -> [event, best before the first held ATH, first held at, last improved at]
+        self.held: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.held)
+
+    def add(self, event: Dict[str, Any], previous: Optional[int], now: float) -> None:
+        held = self.held.get(event["worker"])
+        if held is None:
+            self.held[event["worker"]] = [event, previous, now, now]
+            return
+        if event["bestever"] < held[0]["bestever"]:
+            return
+        if event["bestever"] > held[0]["bestever"]:
+            event["replaced"] = held[0].get("replaced", 0) + 1
+            held[3] = now
+        elif held[0].get("replaced"):
+            # The same record again (the last release failed before it was committed): refresh, not replace
+            event["replaced"] = held[0]["replaced"]
+        held[0] = event
+
+    def due(self, now: float, window: float, max_delay: float,
+            force: bool = False) -> List[Tuple[Dict[str, Any], Optional[int]]]:
+        """(event, previous best) for every worker whose window or max delay has run out"""
+        return [(event, previous) for event, previous, first, last in self.held.values()
+                if force or now - last >= window or now - first >= max_delay]
+
+    def remove(self, events: List[Dict[str, Any]]) -> None:
+        """Forget events once they are safely in the outbox"""
+        for event in events:
+            self.held.pop(event["worker"], None)
+
+    def next_due(self, window: float, max_delay: float) -> Optional[float]:
+        return min((min(last + window, first + max_delay) for _, _, first, last in self.held.values()), default=None)
+
+
+class FarmBest:
+    """The highest best share across every pool, to flag an ATH that is also a new farm-wide best"""
+
+    def __init__(self):
+        self.best = 0
+        # Held from check() until the event is queued, so two pools cannot both claim one new best
+        self.lock = asyncio.Lock()
+
+    def raise_to(self, best: int) -> None:
+        self.best = max(self.best, best)
+
+    def check(self, events: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Mark and return the event that beats the farm best, if any (the highest one).
+
+        The best itself is only raised by raise_to() once the event is queued.
+        """
+        for event in events:
+            event.pop("farm_best", None)
+            event.pop("previous_farm_best", None)
+        top = max(events, key=lambda event: event["bestever"], default=None)
+        if top is None or top["bestever"] <= self.best:
+            return None
+        top["farm_best"] = True
+        top["previous_farm_best"] = self.best or None
+        return top
+
+
+# Shared by every PoolWatcher; they all run on the one event loop
+FARM_BEST = FarmBest()
+
+
+# Hashes needed on average for one share of difficulty 1
+HASHES_PER_DIFF1 = 2 ** 32
+BLOCK_ODDS_DAYS = (1, 7, 30, 365)
+LUCK_QUANTILES = (10, 25, 50, 75, 90)
+ANALYTICS_TOP_WORKERS = int(os.getenv("ANALYTICS_TOP_WORKERS", "25"))
+
+
+def block_odds(blocks_per_second: float) -> Dict[str, float]:
+    """Chance of finding at least one block within each of BLOCK_ODDS_DAYS"""
+    return {f"{days}d": -math.expm1(-blocks_per_second * days * 86400) for days in BLOCK_ODDS_DAYS}
+
+
+def share_luck(best: float, rate: float, first_seen: float, now: float) -> Optional[float]:
+    """Percentile (0-100) of a best share among the bests the same amount of work would produce.
+
+    After W hashes, P(best share < x) = exp(-W / (x * 2^32)); 50 is median
+    luck, higher is luckier. W is estimated as the current hashrate times the
+    time since first_seen, so best must have been found within that window
+    (see WorkerRegistry.raised). None without a hashrate to estimate W from.
+    """
+    work = rate * (now - first_seen)
+    if not work > 0 or best <= 0:
+        return None
+    return 100.0 * math.exp(-work / (best * HASHES_PER_DIFF1))
 
-                try:
-                    bestever_int = int(bestever)
-                except Exception:
-                    continue
 
-                prev = last_bestever.get(raw_name)
+def _quantile(sorted_values: List[float], pct: float) -> float:
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
 
-                # First time seeing this worker: record but don't notify (prevents spam on first run)
-                if prev is None:
-                    last_bestever[raw_name] = bestever_int
-                    changed = True
-                    continue
 
-                # Notify ONLY when it increases
-                if bestever_int > int(prev):
-                    display = pretty_worker_name(raw_name)
+class PoolAnalytics:
+    """Mining-luck figures over every live worker of one pool, recomputed after each poll.
 
-                    # Send Discord notification
-                    discord_post_ath(display, bestever_int, w, pool_data)
+    Reads WorkerRegistry's flat arrays, which diff() keeps current, so an
+    update is one vectorised pass with NumPy (a Python loop without it). Runs
+    between polls of its pool, while nothing else touches the registry. Luck
+    only covers workers whose best was raised since they were first seen.
+    """
 
-                    last_bestever[raw_name] = bestever_int
-                    changed = True
+    def __init__(self, registry: WorkerRegistry):
+        self.registry = registry
+        self.summary: Dict[str, Any] = {}
+
+    def update(self, network_difficulty: Optional[int], now: float) -> Dict[str, Any]:
+        load_numpy()
+        columns = self._columns_numpy(now) if numpy is not None else self._columns_python(now)
+        indexes, bests, rates, lucks = columns
+        if numpy is not None:
+            hashrate = float(rates[rates > 0].sum())
+        else:
+            hashrate = sum(r for r in rates if r > 0)
+        difficulty = float(network_difficulty) if network_difficulty else None
+        blocks_per_second = hashrate / (difficulty * HASHES_PER_DIFF1) if difficulty else 0.0
+
+        summary: Dict[str, Any] = {
+            "updated_at": now,
+            "workers": len(indexes),
+            "hashrate": hashrate,
+            "network_difficulty": network_difficulty,
+            "blocks_per_second": blocks_per_second,
+            "expected_block_seconds": 1 / blocks_per_second if blocks_per_second else None,
+            "block_odds": block_odds(blocks_per_second),
+            "share_distribution": self._distribution(bests),
+            "luck_quantiles": self._luck_quantiles(lucks),
+            "top_workers": self._top_workers(indexes, bests, rates, lucks, difficulty),
+        }
+        self.summary = summary
+        return summary
+
+    def _columns_numpy(self, now: float):
+        registry = self.registry
+        # Copies, not views: views would pin the arrays and make append() fail
+        first_seen = numpy.array(registry.first_seen, dtype=numpy.float64)
+        live = ~numpy.isnan(first_seen)
+        indexes = numpy.flatnonzero(live)
+        bests = numpy.array(registry.bests, dtype=numpy.float64)[live]
+        rates = numpy.array(registry.rates, dtype=numpy.float64)[live]
+        raised = numpy.array(registry.raised, dtype=numpy.bool_)[live]
+        work = numpy.nan_to_num(rates, nan=0.0) * (now - first_seen[live])
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            lucks = numpy.where(raised & (work > 0) & (bests > 0),
+                                100.0 * numpy.exp(-work / (bests * HASHES_PER_DIFF1)), numpy.nan)
+        return indexes, bests, rates, lucks
+
+    def _columns_python(self, now: float):
+        registry = self.registry
+        indexes, bests, rates, lucks = [], [], [], []
+        for i, first_seen in enumerate(registry.first_seen):
+            if math.isnan(first_seen):
+                continue
+            best, rate = float(registry.bests[i]), registry.rates[i]
+            luck = share_luck(best, rate, first_seen, now) if rate > 0 and registry.raised[i] else None
+            indexes.append(i)
+            bests.append(best)
+            rates.append(rate)
+            lucks.append(math.nan if luck is None else luck)
+        return indexes, bests, rates, lucks
+
+    @staticmethod
+    def _distribution(bests) -> List[Dict[str, Any]]:
+        """Workers per decade of best share difficulty"""
+        if numpy is not None:
+            positive = bests[bests >= 1]
+            decades, counts = numpy.unique(numpy.floor(numpy.log10(positive)).astype(numpy.int64), return_counts=True)
+            pairs = zip(decades.tolist(), counts.tolist())
+        else:
+            histogram: Dict[int, int] = {}
+            for best in bests:
+                if best >= 1:
+                    decade = int(math.floor(math.log10(best)))
+                    histogram[decade] = histogram.get(decade, 0) + 1
+            pairs = sorted(histogram.items())
+        return [{"from": 10 ** d, "label": format_mining_number(10 ** d), "workers": n} for d, n in pairs]
+
+    @staticmethod
+    def _luck_quantiles(lucks) -> Dict[str, float]:
+        if numpy is not None:
+            known = lucks[~numpy.isnan(lucks)]
+            if not known.size:
+                return {}
+            values = numpy.percentile(known, LUCK_QUANTILES).tolist()
+        else:
+            known = sorted(l for l in lucks if not math.isnan(l))
+            if not known:
+                return {}
+            values = [_quantile(known, q) for q in LUCK_QUANTILES]
+        return {f"p{q}": v for q, v in zip(LUCK_QUANTILES, values)}
+
+    def _top_workers(self, indexes, bests, rates, lucks, difficulty: Optional[float]) -> List[Dict[str, Any]]:
+        """The ANALYTICS_TOP_WORKERS workers with the highest best share"""
+        limit = min(ANALYTICS_TOP_WORKERS, len(indexes))
+        if not limit:
+            return []
+        if numpy is not None:
+            top = numpy.argpartition(-bests, limit - 1)[:limit]
+            order = top[numpy.argsort(-bests[top])].tolist()
+        else:
+            order = sorted(range(len(bests)), key=bests.__getitem__, reverse=True)[:limit]
+
+        workers = []
+        for i in order:
+            record = self.registry.records[int(indexes[i])]
+            best, rate, luck = float(bests[i]), float(rates[i]), float(lucks[i])
+            workers.append({
+                "worker": record.name,
+                "display": record.display,
+                "bestever": int(best),
+                "block_ratio": best / difficulty if difficulty else None,
+                "hashrate": rate if rate > 0 else None,
+                "expected_block_seconds": difficulty * HASHES_PER_DIFF1 / rate if difficulty and rate > 0 else None,
+                "luck": None if math.isnan(luck) else luck,
+            })
+        return workers
+
+    def worker_luck(self, record: WorkerRecord, best: int, now: float) -> Optional[float]:
+        """Luck of a new ATH, which was necessarily found since the worker was first seen"""
+        registry = self.registry
+        rate = registry.rates[record.index]
+        return share_luck(best, rate, registry.first_seen[record.index], now) if rate > 0 else None
+
+
+class PoolWatcher:
+    """Detection state and poll loop for one pool API"""
+
+    # Worker rows per "workers" event, keeping each datagram well under the backend's 64 KiB reads
+    WORKERS_PER_EVENT = 200
+
+    def __init__(self, name: str, store: HistoryStore, series: SeriesStore, outbox: NotificationOutbox,
+                 board: HeartbeatBoard, executor: ThreadPoolExecutor, lease: Optional[WriterLease] = None):
+        self.name = name
+        self.lease = lease
+        self.store = store
+        self.series = series
+        self.outbox = outbox
+        self.board = board
+        self.executor = executor
+        self.tag = "[poll]" if name == DEFAULT_POOL else f"[poll {name}]"
+        self.pool: Dict[str, Any] = {"name": name}
+        self.registry = WorkerRegistry(name, store, get_worker_evict_seconds())
+        self.analytics = PoolAnalytics(self.registry)
+        self.scheduler = PollScheduler()
+        self.pool_stats = PoolStatsCache()
+        self.wake = asyncio.Event()
+        self.workers_seq = 0
+        self.coalescer = AthCoalescer()
+        FARM_BEST.raise_to(max(self.registry.bests, default=0))
+
+    def refresh_config(self) -> None:
+        for pool in get_pools():
+            if pool["name"] == self.name:
+                self.pool = pool
+                return
+
+    async def fetch(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def run(self) -> None:
+        while True:
+            DIAGNOSTICS.poll_started()
+            started = time.monotonic()
+            delay = await self.poll()
+            DIAGNOSTICS.poll_finished(self.name, started, time.monotonic())
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+    def scan_workers(self, base_url: str, proxy_token: Optional[str], now: float):
+        """Fetch, sample and diff the workers list; runs on the HTTP thread pool.
+
+        Returns None when the list is unchanged (304), else (top-level fields,
+        (worker count, new workers, improvements, unchanged count)).
+        """
+        url = f"{base_url}/api/pool/workers"
+        if load_settings().get("stream_workers", True):
+            return stream_workers_if_changed(url, proxy_token, lambda workers: self.diff_workers(workers, now))
+
+        data, changed = get_json_if_changed(url, "workers", proxy_token)
+        if not changed:
+            return None
+        details = data.get("workers_details", [])
+        if not isinstance(details, list):
+            details = []
+        return data, self.diff_workers(details, now)
+
+    def update_analytics(self, base_url: str, proxy_token: Optional[str], now: float) -> None:
+        """Refresh luck figures; pool stats come from the TTL cache, so this rarely fetches"""
+        try:
+            difficulty = self.pool_stats.context(f"{base_url}/api/pool", proxy_token).get("network_difficulty")
+        except Exception:
+            difficulty = self.analytics.summary.get("network_difficulty")
+        self.analytics.update(difficulty, now)
+
+    def publish_workers(self) -> None:
+        """Push changed and evicted workers to the backend's leaderboard index.
+
+        Each event carries a per-pool sequence number; the backend re-reads a
+        full snapshot() over the control socket when it sees a gap.
+        """
+        changed, removed = self.registry.take_changes()
+        if not changed and not removed:
+            return
+        rows = [self.registry.row(record) for record in changed]
+        difficulty = self.analytics.summary.get("network_difficulty")
+        for start in range(0, max(len(rows), 1), self.WORKERS_PER_EVENT):
+            self.workers_seq += 1
+            EVENTS.publish("workers", pool=self.name, seq=self.workers_seq, network_difficulty=difficulty,
+                           rows=rows[start:start + self.WORKERS_PER_EVENT], removed=removed if start == 0 else [])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every live worker, as of the last published sequence number"""
+        registry = self.registry
+        return {
+            "seq": self.workers_seq,
+            "network_difficulty": self.analytics.summary.get("network_difficulty"),
+            "rows": [registry.row(record) for record in list(registry.by_name.values())],
+        }
+
+    def diff_workers(self, workers: Iterable[Any], now: float):
+        """Record each worker's series sample and diff it in the same single pass"""
+        count = 0
+        series = self.series
+        pool = self.name
+
+        def sampled():
+            nonlocal count
+            for w in workers:
+                count += 1
+                series.record_worker(w, pool, now)
+                yield w
+
+        with Metrics.diff_seconds.time():
+            new_workers, improved, skipped = self.registry.diff(sampled(), now)
+        return count, new_workers, improved, skipped
+
+    async def record(self, new_workers: List[Tuple[str, int]],
+                     improvements: List[Tuple[str, Optional[int], Dict[str, Any]]]) -> None:
+        """Buffer changes in the store; a flush that falls due runs in the thread pool"""
+        if not self.store.record_poll(self.name, new_workers, improvements):
+            return
+        try:
+            await self.fetch(self.store.flush)
+        except (OSError, sqlite3.Error) as e:
+            # Still buffered; the next flush retries it
+            Metrics.errors.inc(label_value="persist")
+            print(f"{self.tag} database write failed, will retry: {e}")
+
+    async def release_held(self, now: float, force: bool = False) -> List[Dict[str, Any]]:
+        """Queue and record the ATHs whose coalescing window has closed; returns their events"""
+        window, max_delay = get_ath_coalesce_seconds()
+        released = self.coalescer.due(now, window, max_delay, force)
+        if not released:
+            return []
+        events = [event for event, _ in released]
+
+        # Journal notifications before state so a crash in between re-detects
+        # (and dedupes) rather than losing the ATH; they stay held if the append fails
+        async with FARM_BEST.lock:
+            farm_best = FARM_BEST.check(events)
+            route_events(events)
+            await self.fetch(self.outbox.enqueue, events)
+            self.coalescer.remove(events)
+            if farm_best is not None:
+                FARM_BEST.raise_to(farm_best["bestever"])
+        for event, previous in released:
+            EVENTS.publish("ath", pool=self.name, worker=event["worker"], display=event["display"],
+                           bestever=event["bestever"], previous=previous, replaced=event.get("replaced", 0),
+                           network_difficulty=event.get("network_difficulty"))
+        if farm_best is not None:
+            EVENTS.publish("farm_best", pool=self.name, worker=farm_best["worker"], display=farm_best["display"],
+                           bestever=farm_best["bestever"], previous=farm_best["previous_farm_best"])
+        await self.record([], [(event["worker"], previous, event) for event, previous in released])
+        return events
+
+    def hold_delay(self, delay: float, now: float) -> float:
+        """Shorten the poll delay so held ATHs go out when their window closes"""
+        due = self.coalescer.next_due(*get_ath_coalesce_seconds())
+        return delay if due is None else max(0.0, min(delay, due - now))
+
+    async def settle_held(self, delay: float) -> float:
+        """release_held() and hold_delay() for polls that end early or fail, so the
+        max delay holds even while the pool API is down"""
+        now = time.time()
+        try:
+            Metrics.aths.inc(len(await self.release_held(now)))
+        except Exception as e:
+            Metrics.errors.inc(label_value="release")
+            print(f"{self.tag} error releasing held ATHs: {e}")
+        return self.hold_delay(delay, now)
+
+    async def poll(self) -> float:
+        """One poll iteration; returns the delay before the next one"""
+        activity = False
+        poll_started = time.perf_counter()
+        if self.lease is not None:
+            self.lease.check()
+        try:
+            self.refresh_config()
+            base_url = self.pool["base_url"]
+            proxy_token = self.pool.get("proxy_token")
+
+            if not get_sink_configs():
+                print(f"{self.tag} No Discord webhook or notification sink configured. Waiting...")
+                delay = await self.settle_held(30)
+                self.board.report(self.name, "waiting_for_webhook", delay)
+                return delay
+
+            # Pool stats are fetched lazily, only when an ATH needs rendering
+            now = time.time()
+            scanned = await self.fetch(self.scan_workers, base_url, proxy_token, now)
+            if scanned is None:
+                events = await self.release_held(now)
+                Metrics.aths.inc(len(events))
+                delay = self.hold_delay(self.scheduler.next_delay(activity=False, pool=self.pool), now)
+                Metrics.polls.inc(label_value="unchanged")
+                Metrics.poll_seconds.observe(time.perf_counter() - poll_started)
+                self.board.report(self.name, "running", delay)
+                print(f"{self.tag} workers unchanged (304) ath={len(events)} held={len(self.coalescer)} pending={len(self.outbox)}")
+                return delay
+
+            top, (worker_count, new_workers, improved, skipped) = scanned
+            # The registry already knows these workers, so buffer them before anything below can fail
+            await self.record(new_workers, [])
+            self.pool_stats.observe_height(top.get("network_height"))
+            registry = self.registry
+
+            # Snapshot new records now; they are notified once their coalescing window closes
+            if improved:
+                pool_ctx = await self.fetch(self.pool_stats.context, f"{base_url}/api/pool", proxy_token)
+                odds = self.analytics.summary.get("block_odds", {})
+                for record, bestever_int, w in improved:
+                    event = make_ath_event(self.name, record.name, record.display, bestever_int, w, pool_ctx)
+                    event["luck"] = self.analytics.worker_luck(record, bestever_int, now)
+                    event["block_odds_30d"] = odds.get("30d")
+                    self.coalescer.add(event, registry.best(record), now)
+            if new_workers:
+                FARM_BEST.raise_to(max(best for _, best in new_workers))
+
+            events = await self.release_held(now)
+            changed = bool(new_workers or events)
+            registry.commit(improved)
+
+            registry.evict_seconds = get_worker_evict_seconds()
+            evicted = registry.evict_stale(now)
+            if evicted:
+                self.series.release([pool_worker_key(self.name, n) for n in evicted])
+                print(f"{self.tag} evicted {len(evicted)} worker(s) not seen for {registry.evict_seconds / 3600:g}h")
+
+            await self.fetch(self.update_analytics, base_url, proxy_token, now)
+            self.publish_workers()
+
+            activity = bool(improved or events)
+            delay = self.hold_delay(self.scheduler.next_delay(activity, pool=self.pool), now)
+            Metrics.polls.inc(label_value="ok")
+            Metrics.aths.inc(len(events))
+            Metrics.workers.set(worker_count, self.name)
+            Metrics.outbox_pending.set(len(self.outbox))
+            Metrics.poll_seconds.observe(time.perf_counter() - poll_started)
+            self.board.report(self.name, "running", delay)
+            print(f"{self.tag} workers={worker_count} unchanged={skipped} state_saved={changed} ath={len(events)} held={len(self.coalescer)} pending={len(self.outbox)} next={delay:.1f}s")
+            return delay
+
+        except Exception as e:
+            delay = await self.settle_held(self.scheduler.next_delay(activity, error=True, pool=self.pool))
+            Metrics.polls.inc(label_value="error")
+            Metrics.errors.inc(label_value="poll")
+            EVENTS.publish("error", pool=self.name, stage="poll", error=str(e))
+            self.board.report(self.name, "error", delay, str(e))
+            print(f"{self.tag} error: {e} (retrying in {delay:.1f}s)")
+            return delay
 
-            if changed:
-                save_state({"last_bestever": last_bestever})
 
-            print(f"[poll] workers={len(details)} state_saved={changed} webhook_configured={bool(webhook)}")
+class WatcherEngine:
+    """Runs one PoolWatcher task per configured pool on a single event loop.
 
-        except Exception as e:
-            print(f"[poll] error: {e}")
-            poll_seconds = get_poll_seconds()
+    All pools share the HTTP session and thread pool, the database, the series
+    file and the notification outbox. The pool list is re-read every
+    RECONCILE_SECONDS so pools can be added or removed without a restart.
+    """
+
+    RECONCILE_SECONDS = 5
+    SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+    # Undelivered notifications stay in the outbox for the next run
+    SHUTDOWN_DRAIN_SECONDS = 5
+
+    def __init__(self, store: HistoryStore, series: SeriesStore, outbox: NotificationOutbox,
+                 lease: Optional[WriterLease] = None, router: Optional["NotificationRouter"] = None):
+        self.store = store
+        self.series = series
+        self.outbox = outbox
+        self.lease = lease
+        self.router = router
+        self.board = HeartbeatBoard()
+        self.executor = ThreadPoolExecutor(max_workers=HTTP_CONCURRENCY, thread_name_prefix="http")
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.watchers: Dict[str, PoolWatcher] = {}
+        self.control = ControlServer(CONTROL_SOCKET, self)
+        self.stopping: Optional[asyncio.Event] = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for sig in self.SHUTDOWN_SIGNALS:
+            loop.add_signal_handler(sig, self.stopping.set)
+        loop.add_signal_handler(signal.SIGUSR1, DIAGNOSTICS.request_profile)
+        loop.add_signal_handler(signal.SIGUSR2, DIAGNOSTICS.toggle_memory)
+        renewing = asyncio.create_task(self.hold_lease(), name="lease") if self.lease is not None else None
+        await self.control.start()
+        while not self.stopping.is_set():
+            self.reconcile()
+            await loop.run_in_executor(self.executor, self.persist)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.RECONCILE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        if renewing is not None:
+            renewing.cancel()
+        await self.shutdown()
+
+    def persist(self) -> None:
+        """Commit buffered database writes when due and take the periodic backup"""
+        try:
+            self.store.maybe_flush()
+            if self.store.backup_due():
+                print(f"[watcher] Backed up the database to {self.store.backup()}")
+        except (OSError, sqlite3.Error) as e:
+            print(f"[watcher] Persisting failed, will retry: {e}")
+
+    async def shutdown(self) -> None:
+        """Stop polling, write everything buffered and hand the lease straight to a standby"""
+        print("[watcher] Shutting down...")
+        if self.control.server is not None:
+            self.control.server.close()
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        for watcher in self.watchers.values():
+            held = await watcher.release_held(time.time(), force=True)
+            if held:
+                print(f"{watcher.tag} Sent {len(held)} held ATH(s) early")
+        loop = asyncio.get_running_loop()
+        try:
+            written = await loop.run_in_executor(self.executor, self.store.flush)
+            self.series.sync()
+            if written:
+                print(f"[watcher] Flushed {written} buffered database write(s)")
+        except (OSError, sqlite3.Error) as e:
+            print(f"[watcher] Final flush failed: {e}")
+        if self.router is not None:
+            await loop.run_in_executor(None, self.router.drain, self.SHUTDOWN_DRAIN_SECONDS)
+        # Only the lease holder owns the heartbeat; a replica that lost it must not overwrite the new one's
+        if self.lease is None or self.lease.held():
+            self.board.stop()
+        if self.lease is not None:
+            await loop.run_in_executor(None, self.lease.release)
+        print("[watcher] Stopped")
+
+    async def hold_lease(self) -> None:
+        """Renew from the event loop, so a stuck loop lets the lease lapse to a standby.
+
+        A failed renewal is retried every ttl/10 until the lease runs out; only
+        renew() finding the row taken by another replica gives it up.
+        """
+        loop = asyncio.get_running_loop()
+        interval = self.lease.ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.lease.renew)
+            except sqlite3.Error as e:
+                Metrics.errors.inc(label_value="lease")
+                print(f"[watcher] Could not renew the writer lease ({e}); retrying")
+                interval = self.lease.ttl / 10
+            else:
+                interval = self.lease.ttl / 3
+
+    def reconcile(self) -> None:
+        names = [pool["name"] for pool in get_pools()]
+
+        for name in list(self.tasks):
+            if name not in names:
+                print(f"[watcher] Stopped watching pool {name}")
+                self.tasks.pop(name).cancel()
+                self.watchers.pop(name, None)
+                self.board.forget(name)
+
+        for name in names:
+            task = self.tasks.get(name)
+            if task is not None and task.done() and not task.cancelled():
+                print(f"[watcher] Pool {name} loop exited ({task.exception()!r}); restarting")
+                task = None
+            if task is None:
+                watcher = PoolWatcher(name, self.store, self.series, self.outbox, self.board, self.executor, self.lease)
+                self.watchers[name] = watcher
+                self.tasks[name] = asyncio.create_task(watcher.run(), name=f"pool:{name}")
+                if name != DEFAULT_POOL:
+                    print(f"[watcher] Watching pool {name}")
+
+    def poll_now(self, pool: Optional[str] = None) -> List[str]:
+        """Pick up pool and sink changes and cut the current wait short; returns the pools woken"""
+        self.reconcile()
+        if self.router is not None:
+            self.router.wake.set()
+        woken = [name for name in self.watchers if pool is None or name == pool]
+        for name in woken:
+            self.watchers[name].wake.set()
+        return woken
+
+    def analytics(self, pool: Optional[str] = None) -> Dict[str, Any]:
+        """Per-pool luck summaries plus farm-wide time-to-block and block odds"""
+        pools = {name: watcher.analytics.summary for name, watcher in self.watchers.items()
+                 if watcher.analytics.summary and (pool is None or name == pool)}
+        blocks_per_second = sum(p["blocks_per_second"] for p in pools.values())
+        farm = {
+            "workers": sum(p["workers"] for p in pools.values()),
+            "hashrate": sum(p["hashrate"] for p in pools.values()),
+            "blocks_per_second": blocks_per_second,
+            "expected_block_seconds": 1 / blocks_per_second if blocks_per_second else None,
+            "block_odds": block_odds(blocks_per_second),
+        }
+        return {"farm": farm, "pools": pools, "vectorized": numpy is not None}
+
+    def state(self) -> Dict[str, Any]:
+        pools = {}
+        for name, watcher in self.watchers.items():
+            pools[name] = dict(self.board.pools.get(name, {}), workers=len(watcher.registry),
+                               base_url=watcher.pool.get("base_url"))
+        return {
+            "pid": os.getpid(),
+            "lease_epoch": self.lease.epoch if self.lease is not None else None,
+            "webhook_configured": bool(get_webhook()),
+            "sinks": [config["name"] for config in get_sink_configs()],
+            "outbox_pending": len(self.outbox),
+            "pools": pools,
+        }
+
+
+class ControlServer:
+    """Commands from the backend over a Unix stream socket, one JSON object per line each way.
+
+    {"cmd": "reload", "settings": {...}} applies just-saved settings and polls every pool now
+    {"cmd": "poll", "pool": name}         polls one pool (or all) now
+    {"cmd": "test_webhook", "webhook": u} posts a test message (default: the configured webhook)
+    {"cmd": "state"}                      live per-pool state, outbox depth and lease epoch
+    {"cmd": "analytics", "pool": name}    luck and time-to-block figures (PoolAnalytics)
+    {"cmd": "workers"}                    every live worker per pool, to rebuild the leaderboard
+    {"cmd": "profile", "polls": n}        sample stacks during the next n polls (Diagnostics)
+    {"cmd": "memory", "action": a}        tracemalloc: "start", "snapshot" or "stop"
+    {"cmd": "diagnostics"}                what Diagnostics is doing right now
+    Replies are {"ok": true, ...} or {"ok": false, "error": "..."}.
+    """
+
+    MAX_LINE = 1 << 20
+
+    def __init__(self, path: str, engine: WatcherEngine):
+        self.path = path
+        self.engine = engine
+        self.server: Optional[asyncio.AbstractServer] = None
 
-        time.sleep(poll_seconds)
+    async def start(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        try:
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path, limit=self.MAX_LINE)
+        except OSError as e:
+            print(f"[watcher] control socket unavailable ({e}); settings apply on the next file change")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.dispatch(json.loads(line))
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # client went away or sent an over-long line
+        finally:
+            writer.close()
+
+    async def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = request.get("cmd")
+        engine = self.engine
+        if cmd == "reload":
+            if isinstance(request.get("settings"), dict):
+                SETTINGS.replace(request["settings"])
+            print("[watcher] Settings reloaded")
+            return {"ok": True, "polling": engine.poll_now()}
+        if cmd == "poll":
+            return {"ok": True, "polling": engine.poll_now(request.get("pool"))}
+        if cmd == "test_webhook":
+            webhook = request.get("webhook") or get_webhook()
+            if not webhook:
+                return {"ok": False, "error": "no Discord webhook configured"}
+            await asyncio.get_running_loop().run_in_executor(engine.executor, send_test_message, webhook)
+            return {"ok": True}
+        if cmd == "state":
+            return {"ok": True, "state": engine.state()}
+        if cmd == "analytics":
+            return {"ok": True, "analytics": engine.analytics(request.get("pool"))}
+        if cmd == "profile":
+            DIAGNOSTICS.request_profile(request.get("polls") or PROFILE_POLLS)
+            engine.poll_now()
+            return {"ok": True, "diagnostics": DIAGNOSTICS.state()}
+        if cmd == "memory":
+            action = request.get("action")
+            if action == "start":
+                DIAGNOSTICS.memory_start()
+                path = None
+            elif action in ("snapshot", "stop"):
+                if DIAGNOSTICS.memory_first is None:
+                    return {"ok": False, "error": "allocation tracing is not running"}
+                path = DIAGNOSTICS.memory_snapshot() if action == "snapshot" else DIAGNOSTICS.memory_stop()
+            else:
+                return {"ok": False, "error": f"unknown memory action {action!r}"}
+            return {"ok": True, "file": path, "diagnostics": DIAGNOSTICS.state()}
+        if cmd == "diagnostics":
+            return {"ok": True, "diagnostics": DIAGNOSTICS.state()}
+        if cmd == "workers":
+            return {"ok": True, "pools": {name: watcher.snapshot() for name, watcher in engine.watchers.items()}}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+
+def main():
+    print("[watcher] Starting AxeBCH ATH Watcher...")
+    for pool in get_pools():
+        print(f"[watcher] Pool {pool['name']}: {pool['base_url']}")
+    print(f"[watcher] Database: {DB_FILE}")
+
+    # Only the lease holder checks and repairs the database and opens the outbox,
+    # series file and heartbeat; standbys wait here
+    try:
+        lease = WriterLease(DB_FILE)
+        lease.wait()
+    except sqlite3.DatabaseError as e:
+        # Too damaged to hold the lease: a holder cannot renew in it either, so once
+        # a full lease period has passed nobody is left writing to these files
+        print(f"[watcher] Cannot take the writer lease ({e}); waiting {LEASE_SECONDS:g}s before recovering")
+        time.sleep(LEASE_SECONDS)
+        lease = None
+    recovered = HistoryStore.recover(DB_FILE, lease)
+    if recovered:
+        print(f"[watcher] Database failed its integrity check: {recovered}")
+    if lease is None or recovered:
+        # The database file was replaced; take the lease in the one now at DB_FILE
+        if lease is None:
+            lease = WriterLease(DB_FILE)
+        else:
+            lease.reopen()
+        lease.wait()
+
+    store = HistoryStore(DB_FILE)
+    store.lease = lease
+    imported = store.import_state_file(STATE_FILE)
+    if imported:
+        print(f"[watcher] Imported {imported} worker best(s) from {STATE_FILE}")
+
+    series = SeriesStore(SERIES_FILE)
+
+    outbox = NotificationOutbox(OUTBOX_FILE)
+    outbox.lease = lease
+    if len(outbox):
+        print(f"[watcher] Resuming {len(outbox)} undelivered notification(s)")
+    router = NotificationRouter(outbox)
+    router.start()
+
+    asyncio.run(WatcherEngine(store, series, outbox, lease, router).run())
 
 
 if __name__ == "__main__":